@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""Compare get/set latency of the polling and the reactor event loops.
+
+Starts a private Xvfb server, then runs the same workload once with
+:attr:`klembord.xclipboard.XReactor.poll_interval` set to the old 5 ms
+quantum and once with the select based reactor, each in a fresh process.
+
+Usage:
+	python benchmarks/latency.py [--rounds N]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from xvfb import start_xvfb, stop_xvfb, environment
+
+
+MODES = {'polling': 0.005, 'reactor': None}
+
+
+def summary(samples):
+	samples = sorted(samples)
+	return {
+		'median_ms': statistics.median(samples) * 1000,
+		'p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000,
+		'min_ms': samples[0] * 1000,
+	}
+
+
+def worker(mode, rounds):
+	from klembord import Selection
+	from klembord.xclipboard import XReactor
+
+	XReactor.poll_interval = MODES[mode]
+	# Two objects, a selection reading what it set itself is answered from
+	# its own content without going through the X server.
+	writer, reader = Selection(), Selection()
+	writer.set_text('warm up')
+	reader.get_text()
+
+	get_samples = []
+	for _ in range(rounds):
+		start = time.perf_counter()
+		reader.get_text()
+		get_samples.append(time.perf_counter() - start)
+
+	roundtrip_samples = []
+	for i in range(rounds):
+		text = 'round {}'.format(i)
+		start = time.perf_counter()
+		writer.set_text(text)
+		while reader.get_text() != text:
+			pass
+		roundtrip_samples.append(time.perf_counter() - start)
+
+	cpu = time.process_time()
+	time.sleep(2)
+	idle_cpu = time.process_time() - cpu
+
+	json.dump({
+		'get_text': summary(get_samples),
+		'set_then_get': summary(roundtrip_samples),
+		'idle_cpu_percent': idle_cpu / 2 * 100,
+	}, sys.stdout)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--rounds', type=int, default=200)
+	parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.worker:
+		worker(args.worker, args.rounds)
+		return
+
+	server, display_name = start_xvfb()
+	env = environment(display_name)
+	try:
+		results = {}
+		for mode in MODES:
+			output = subprocess.run(
+				[
+					sys.executable, os.path.abspath(__file__),
+					'--worker', mode, '--rounds', str(args.rounds),
+				],
+				env=env,
+				check=True,
+				stdout=subprocess.PIPE,
+			).stdout
+			results[mode] = json.loads(output)
+	finally:
+		stop_xvfb(server)
+
+	for mode, result in results.items():
+		print(mode)
+		for name in ('get_text', 'set_then_get'):
+			print('  {:<14} median {median_ms:8.3f} ms  p95 {p95_ms:8.3f} ms'
+				'  min {min_ms:8.3f} ms'.format(name, **result[name]))
+		print('  {:<14} {:.2f} %'.format('idle cpu', result['idle_cpu_percent']))
+
+
+if __name__ == '__main__':
+	main()
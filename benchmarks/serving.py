@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""Measure how many selection requests an owner serves per second.
+
+Starts a private Xvfb server and an owner process holding text, HTML and a
+few more targets, then several requestor processes, each with several
+threads, that get() TARGETS and text from it as fast as they can. The
+owner counts every request it served through
+:class:`klembord.instrument.Collector`.
+
+Usage:
+	python benchmarks/serving.py [--processes N] [--threads N]
+		[--duration SECONDS]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from threading import Thread
+from xvfb import start_xvfb, stop_xvfb, environment
+
+
+CONTENT = {
+	'UTF8_STRING': 'served text ' * 32,
+	'STRING': 'served text ' * 32,
+	'text/html': '<p>served text</p>' * 32,
+	'text/plain': 'served text ' * 32,
+	'application/x-klembord-binary': bytes(range(256)) * 16,
+}
+QUERY = ('TARGETS', 'UTF8_STRING')
+
+
+def owner():
+	from klembord import Selection, instrument
+
+	collector = instrument.Collector()
+	selection = Selection()
+	selection.set(CONTENT)
+	instrument.set_hook(collector)
+	print('ready', flush=True)
+	# Requestors are done once stdin closes.
+	sys.stdin.read()
+	instrument.set_hook(None)
+	json.dump(collector.snapshot(), sys.stdout)
+
+
+def requestor(threads, duration):
+	from klembord import Selection
+
+	selection = Selection(timeout=5.0)
+	counts = [0] * threads
+	deadline = time.monotonic() + duration
+
+	def run(index):
+		while time.monotonic() < deadline:
+			content = selection.get(QUERY)
+			if content['UTF8_STRING'] is not None:
+				counts[index] += 1
+
+	workers = [Thread(target=run, args=(i, )) for i in range(threads)]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	json.dump({'gets': sum(counts)}, sys.stdout)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--processes', type=int, default=4)
+	parser.add_argument('--threads', type=int, default=8)
+	parser.add_argument('--duration', type=float, default=5.0)
+	parser.add_argument('--owner', action='store_true', help=argparse.SUPPRESS)
+	parser.add_argument('--requestor', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.owner:
+		owner()
+		return
+	if args.requestor:
+		requestor(args.threads, args.duration)
+		return
+
+	server, display_name = start_xvfb()
+	env = environment(display_name)
+	script = os.path.abspath(__file__)
+	owner_process = subprocess.Popen(
+		[sys.executable, script, '--owner'],
+		env=env,
+		stdin=subprocess.PIPE,
+		stdout=subprocess.PIPE,
+		universal_newlines=True,
+	)
+	try:
+		owner_process.stdout.readline()
+		start = time.perf_counter()
+		requestors = [
+			subprocess.Popen(
+				[
+					sys.executable, script, '--requestor',
+					'--threads', str(args.threads),
+					'--duration', str(args.duration),
+				],
+				env=env,
+				stdout=subprocess.PIPE,
+			) for _ in range(args.processes)
+		]
+		gets = sum(
+			json.loads(process.communicate()[0])['gets']
+			for process in requestors
+		)
+		elapsed = time.perf_counter() - start
+		snapshot = json.loads(owner_process.communicate('')[0])
+	finally:
+		if owner_process.poll() is None:
+			owner_process.kill()
+		stop_xvfb(server)
+
+	served = snapshot['latencies'].get('serve', {}).get('count', 0)
+	json.dump({
+		'requestors': args.processes * args.threads,
+		'seconds': elapsed,
+		'requests_served': served,
+		'requests_per_s': served / elapsed,
+		'gets_per_s': gets / elapsed,
+		'serve_latency': snapshot['latencies'].get('serve'),
+	}, sys.stdout, indent='\t')
+	print()
+
+
+if __name__ == '__main__':
+	main()
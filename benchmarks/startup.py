@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Measure import time, Selection() construction and first-call latency.
+
+Every measurement runs in a fresh interpreter against a private Xvfb
+server. The 'eager' rows reproduce what ``import klembord`` and
+``Selection()`` used to cost before backends were loaded lazily: importing
+:mod:`klembord.xclipboard` and connecting both getter and setter up front.
+
+Usage:
+	python benchmarks/startup.py [--runs N]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from xvfb import start_xvfb, stop_xvfb, environment
+
+
+SNIPPETS = {
+	'import klembord': (
+		'import klembord',
+		'',
+	),
+	'import eager': (
+		'import klembord.xclipboard',
+		'',
+	),
+	'Selection()': (
+		'import klembord',
+		'klembord.Selection()',
+	),
+	'Selection() eager': (
+		'import klembord.xclipboard as x',
+		's = x.XSelection(); s.getter; s.setter',
+	),
+	'first get_text()': (
+		'import klembord; s = klembord.Selection()',
+		's.get_text()',
+	),
+	'first set_text()': (
+		'import klembord; s = klembord.Selection()',
+		's.set_text("startup")',
+	),
+}
+
+WORKER = '''
+import sys, time, json
+start = time.perf_counter()
+{setup}
+setup = time.perf_counter() - start
+start = time.perf_counter()
+{statement}
+statement = time.perf_counter() - start
+json.dump({{
+	'setup': setup,
+	'statement': statement,
+	'xlib_loaded': 'Xlib' in sys.modules,
+}}, sys.stdout)
+'''
+
+
+def measure(name, env):
+	setup, statement = SNIPPETS[name]
+	output = subprocess.run(
+		[sys.executable, '-c', WORKER.format(setup=setup, statement=statement)],
+		env=env,
+		check=True,
+		stdout=subprocess.PIPE,
+	).stdout
+	result = json.loads(output)
+	# Bare imports are timed by their setup, everything else by statement.
+	result['seconds'] = result['statement'] if statement else result['setup']
+	return result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--runs', type=int, default=20)
+	args = parser.parse_args()
+
+	server, display_name = start_xvfb()
+	env = environment(display_name)
+	try:
+		for name in SNIPPETS:
+			results = [measure(name, env) for _ in range(args.runs)]
+			print('{:<20} median {:8.3f} ms   Xlib loaded: {}'.format(
+				name,
+				statistics.median(r['seconds'] for r in results) * 1000,
+				results[0]['xlib_loaded'],
+			))
+	finally:
+		stop_xvfb(server)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""Stress concurrent get() calls against a selection owned by another process.
+
+Starts a private Xvfb server and an owner process holding several targets,
+one of them large enough to be sent with INCR. Then N threads of this
+process call get() on overlapping target lists at the same time and check
+every result byte for byte. Exits with status 1 if any result was wrong.
+
+Usage:
+	python benchmarks/stress.py [--threads N] [--rounds N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from threading import Thread
+from xvfb import ROOT, start_xvfb, stop_xvfb, environment
+
+
+CONTENT = {
+	'UTF8_STRING': 'stress ünïcode'.encode('utf8'),
+	'STRING': b'stress',
+	'text/html': b'<b>stress</b>',
+	'application/x-klembord-large': bytes(range(256)) * 4096,
+}
+
+QUERIES = [
+	('UTF8_STRING', ),
+	('STRING', 'UTF8_STRING'),
+	('text/html', 'UTF8_STRING', 'TARGETS'),
+	('application/x-klembord-large', ),
+	('application/x-klembord-large', 'STRING', 'text/html'),
+]
+
+
+def owner():
+	from klembord import Selection
+
+	selection = Selection()
+	selection.set(CONTENT)
+	print('ready', flush=True)
+	# The setter serves requests from its own thread, just stay alive.
+	sys.stdin.read()
+
+
+def reader(selection, index, rounds, errors):
+	for i in range(rounds):
+		targets = QUERIES[(index + i) % len(QUERIES)]
+		try:
+			content = selection.get(targets)
+		except Exception as e:
+			errors.append('{}: {!r}'.format(targets, e))
+			continue
+		for target in targets:
+			if target == 'TARGETS':
+				offered = set(content[target] or ())
+				if not offered.issuperset(CONTENT):
+					errors.append('TARGETS: {!r}'.format(content[target]))
+			elif content[target] != CONTENT[target]:
+				errors.append('{}: got {} bytes'.format(
+					target,
+					None if content[target] is None else len(content[target]),
+				))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--threads', type=int, default=16)
+	parser.add_argument('--rounds', type=int, default=50)
+	parser.add_argument('--owner', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.owner:
+		owner()
+		return
+
+	server, display_name = start_xvfb()
+	env = environment(display_name)
+	os.environ['DISPLAY'] = display_name
+	process = subprocess.Popen(
+		[sys.executable, os.path.abspath(__file__), '--owner'],
+		env=env,
+		stdin=subprocess.PIPE,
+		stdout=subprocess.PIPE,
+		universal_newlines=True,
+	)
+	try:
+		process.stdout.readline()
+		sys.path.insert(0, ROOT)
+		from klembord import Selection
+
+		selection = Selection(timeout=5.0)
+		errors = []
+		threads = [
+			Thread(target=reader, args=(selection, i, args.rounds, errors))
+			for i in range(args.threads)
+		]
+		start = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - start
+	finally:
+		process.stdin.close()
+		process.wait()
+		stop_xvfb(server)
+
+	calls = args.threads * args.rounds
+	print('{} get() calls from {} threads in {:.2f} s, {:.0f} calls/s'.format(
+		calls, args.threads, elapsed, calls / elapsed,
+	))
+	if errors:
+		print('{} wrong results, first ones:'.format(len(errors)))
+		for error in errors[:10]:
+			print('  ' + error)
+		sys.exit(1)
+	print('all results correct')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+"""Run the klembord benchmark suite against a private Xvfb server.
+
+Measures import plus Selection() construction, set_text/get_text round
+trips between two selections, get() throughput with 1 to N targets,
+payload size scaling from 1 KB to 100 MB and get() throughput with
+concurrent requestors. All but the round trip read from an owner running
+in a separate process.
+
+Every measurement runs in processes of its own against one klembord
+source tree: this checkout by default, any commit with ``--rev``, or the
+baseline commit the performance work started from with ``--baseline``.
+That one still has the 5 ms polling loop, the 50 ms inbox waits and a
+thread per ownership, so it is the reference to compare against:
+
+	python benchmarks/suite.py --baseline --output baseline.json
+	python benchmarks/suite.py --output current.json --compare baseline.json
+
+Usage:
+	python benchmarks/suite.py [--baseline | --rev REV] [--rounds N]
+		[--output FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import platform
+import tempfile
+import subprocess
+from threading import Thread
+from xvfb import ROOT, start_xvfb, stop_xvfb, environment
+from latency import summary
+
+
+# Commit the performance work started from.
+BASELINE = '67da0eff3ce388ce03395dbd1819a75fca343411'
+TARGET_COUNTS = (1, 2, 4, 8, 16)
+PAYLOAD_SIZES = (
+	1024,
+	10 * 1024,
+	100 * 1024,
+	1024 * 1024,
+	10 * 1024 * 1024,
+	100 * 1024 * 1024,
+)
+REQUESTORS = (1, 4, 16)
+PAYLOAD_TARGET = 'application/x-klembord-payload'
+
+# Timed from before the import, so Xlib and backend loading are included
+# whenever the tree under test does them.
+CONSTRUCTION = '''
+import sys, time, json
+start = time.perf_counter()
+import klembord
+selection = klembord.Selection()
+constructed = time.perf_counter()
+selection.get(['TARGETS'])
+json.dump({
+	'import + Selection()': constructed - start,
+	'first get()': time.perf_counter() - constructed,
+}, sys.stdout)
+'''
+
+
+def payload(size):
+	return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+def version(root):
+	with open(os.path.join(root, 'pyproject.toml')) as pyproject:
+		for line in pyproject:
+			if line.startswith('version'):
+				return line.split('=')[1].strip().strip('"')
+	return None
+
+
+def export(rev, directory):
+	# Writes the tree of rev to directory, returns the commit it resolved to.
+	commit = subprocess.run(
+		['git', 'rev-parse', '--verify', rev + '^{commit}'],
+		cwd=ROOT,
+		check=True,
+		stdout=subprocess.PIPE,
+		universal_newlines=True,
+	).stdout.strip()
+	archive = subprocess.Popen(
+		['git', 'archive', '--format=tar', commit],
+		cwd=ROOT,
+		stdout=subprocess.PIPE,
+	)
+	with tarfile.open(fileobj=archive.stdout, mode='r|') as tar:
+		tar.extractall(directory)
+	if archive.wait():
+		sys.exit('git archive failed for {}'.format(rev))
+	return commit
+
+
+def selection(timeout):
+	from klembord import Selection
+
+	try:
+		return Selection(timeout=timeout)
+	except TypeError:
+		# Older trees have no timeout argument.
+		return Selection()
+
+
+def owner():
+	# Serves whatever the suite asks for, one JSON command per line.
+	from klembord import Selection
+
+	owned = Selection()
+	for line in sys.stdin:
+		sizes = json.loads(line)
+		owned.set({target: payload(size) for target, size in sizes.items()})
+		print('ok', flush=True)
+
+
+class Owner(object):
+
+	def __init__(self):
+		self.process = subprocess.Popen(
+			[sys.executable, os.path.abspath(__file__), '--owner'],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE,
+			universal_newlines=True,
+		)
+
+	def set(self, sizes):
+		self.process.stdin.write(json.dumps(sizes) + '\n')
+		self.process.stdin.flush()
+		self.process.stdout.readline()
+
+	def close(self):
+		self.process.stdin.close()
+		self.process.wait()
+
+
+def timed(call, rounds):
+	samples = []
+	for _ in range(rounds):
+		start = time.perf_counter()
+		call()
+		samples.append(time.perf_counter() - start)
+	return samples
+
+
+def construction(env, rounds):
+	results = {'import + Selection()': [], 'first get()': []}
+	for _ in range(rounds):
+		output = subprocess.run(
+			[sys.executable, '-c', CONSTRUCTION],
+			env=env,
+			check=True,
+			stdout=subprocess.PIPE,
+		).stdout
+		for name, seconds in json.loads(output).items():
+			results[name].append(seconds)
+	return {name: summary(samples) for name, samples in results.items()}
+
+
+def roundtrip(rounds):
+	from klembord import Selection
+
+	# Two objects, so the reader goes through the X server instead of
+	# answering from the content it set itself.
+	writer, reader = Selection(), Selection()
+	samples = []
+	for i in range(rounds):
+		text = 'round {}'.format(i)
+		start = time.perf_counter()
+		writer.set_text(text)
+		while reader.get_text() != text:
+			pass
+		samples.append(time.perf_counter() - start)
+	return {'set_text/get_text': summary(samples)}
+
+
+def get_targets(reader, owner, rounds):
+	results = {}
+	for count in TARGET_COUNTS:
+		targets = ['application/x-klembord-{}'.format(i) for i in range(count)]
+		owner.set({target: 64 for target in targets})
+		reader.get(targets)
+		samples = timed(lambda: reader.get(targets), rounds)
+		result = summary(samples)
+		result['calls_per_s'] = len(samples) / sum(samples)
+		results[str(count)] = result
+	return results
+
+
+def payload_scaling(reader, owner, rounds):
+	results = {}
+	for size in PAYLOAD_SIZES:
+		owner.set({PAYLOAD_TARGET: size})
+		runs = max(3, min(rounds, 100 * 1024 * 1024 // size // 10))
+		failed = []
+
+		def get():
+			data = reader.get((PAYLOAD_TARGET, ))[PAYLOAD_TARGET]
+			if data is None or len(data) != size:
+				failed.append(size)
+
+		samples = timed(get, runs)
+		if failed:
+			# Older trees give up on large payloads, there's no rate.
+			results[str(size)] = {'failed': len(failed), 'runs': runs}
+			continue
+		result = summary(samples)
+		result['mb_per_s'] = size * len(samples) / sum(samples) / 1e6
+		results[str(size)] = result
+	return results
+
+
+def concurrent(reader, owner, rounds):
+	results = {}
+	targets = ('UTF8_STRING', )
+	owner.set({'UTF8_STRING': 1024})
+	for threads in REQUESTORS:
+
+		def read():
+			for _ in range(rounds):
+				reader.get(targets)
+
+		workers = [Thread(target=read) for _ in range(threads)]
+		start = time.perf_counter()
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+		elapsed = time.perf_counter() - start
+		results[str(threads)] = {'calls_per_s': threads * rounds / elapsed}
+	return results
+
+
+def measure(rounds):
+	# Runs in a process of its own, klembord comes from PYTHONPATH.
+	results = {'roundtrip': roundtrip(rounds)}
+	owner_process = Owner()
+	try:
+		reader = selection(60.0)
+		results['get_targets'] = get_targets(reader, owner_process, rounds)
+		results['payload'] = payload_scaling(reader, owner_process, rounds)
+		results['concurrent'] = concurrent(reader, owner_process, rounds)
+	finally:
+		owner_process.close()
+	json.dump(results, sys.stdout)
+
+
+def compare(current, baseline, path=()):
+	# Prints every metric present in both, with current / baseline.
+	for name, value in current.items():
+		other = baseline.get(name) if isinstance(baseline, dict) else None
+		if isinstance(value, dict):
+			compare(value, other or {}, path + (name, ))
+		elif isinstance(value, (int, float)) and isinstance(other, (int, float)):
+			print('{:<60} {:12.3f} {:12.3f} {:8.2f}x'.format(
+				'/'.join(path + (name, )),
+				other,
+				value,
+				value / other if other else float('inf'),
+			))
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	source = parser.add_mutually_exclusive_group()
+	source.add_argument(
+		'--rev', help='measure this commit instead of the working tree'
+	)
+	source.add_argument(
+		'--baseline',
+		action='store_const',
+		const=BASELINE,
+		dest='rev',
+		help='measure the baseline commit',
+	)
+	parser.add_argument('--rounds', type=int, default=100)
+	parser.add_argument('--output', help='write results to this JSON file')
+	parser.add_argument('--compare', help='baseline JSON file to compare to')
+	parser.add_argument('--owner', action='store_true', help=argparse.SUPPRESS)
+	parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.owner:
+		owner()
+		return
+	if args.measure:
+		measure(args.rounds)
+		return
+
+	directory = None
+	root, commit = ROOT, None
+	if args.rev:
+		directory = tempfile.mkdtemp(prefix='klembord-suite-')
+		commit = export(args.rev, directory)
+		root = directory
+	server, display_name = start_xvfb()
+	env = environment(display_name, root)
+	results = {
+		'version': version(root),
+		'commit': commit,
+		'python': platform.python_version(),
+		'rounds': args.rounds,
+		'results': {},
+	}
+	try:
+		results['results']['construction'] = construction(
+			env, max(3, args.rounds // 10)
+		)
+		output = subprocess.run(
+			[
+				sys.executable, os.path.abspath(__file__),
+				'--measure', '--rounds', str(args.rounds),
+			],
+			env=env,
+			check=True,
+			stdout=subprocess.PIPE,
+		).stdout
+		results['results'].update(json.loads(output))
+	finally:
+		stop_xvfb(server)
+		if directory is not None:
+			shutil.rmtree(directory, ignore_errors=True)
+
+	output = json.dumps(results, indent='\t', sort_keys=True)
+	if args.output:
+		with open(args.output, 'w') as out:
+			out.write(output + '\n')
+	else:
+		print(output)
+	if args.compare:
+		with open(args.compare) as baseline:
+			baseline = json.load(baseline)
+		print('{:<60} {:>12} {:>12} {:>9}'.format(
+			'metric',
+			(baseline.get('commit') or 'working tree')[:12],
+			(commit or 'working tree')[:12],
+			'ratio',
+		))
+		compare(results['results'], baseline['results'])
+
+
+if __name__ == '__main__':
+	main()
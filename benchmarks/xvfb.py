@@ -0,0 +1,50 @@
+"""Helpers for running benchmarks against a private Xvfb server."""
+
+import os
+import sys
+import shutil
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_xvfb():
+	"""Start Xvfb on a free display.
+
+	Returns:
+		tuple: The server :class:`subprocess.Popen` and its display name.
+	"""
+
+	if not shutil.which('Xvfb'):
+		sys.exit('Xvfb not found in PATH')
+	read_fd, write_fd = os.pipe()
+	server = subprocess.Popen(
+		['Xvfb', '-displayfd', str(write_fd), '-nolisten', 'tcp'],
+		pass_fds=(write_fd, ),
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,
+	)
+	os.close(write_fd)
+	with os.fdopen(read_fd) as displayfd:
+		number = displayfd.readline().strip()
+	if not number:
+		server.kill()
+		sys.exit('Xvfb failed to start')
+	return server, ':{}'.format(number)
+
+
+def stop_xvfb(server):
+	server.terminate()
+	server.wait()
+
+
+def environment(display_name, root=ROOT):
+	"""Environment for worker processes: the Xvfb display and the klembord
+	source tree at root, this checkout by default, on PYTHONPATH."""
+
+	env = dict(os.environ, DISPLAY=display_name)
+	env['PYTHONPATH'] = os.pathsep.join(
+		filter(None, (root, env.get('PYTHONPATH')))
+	)
+	return env
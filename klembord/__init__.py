@@ -15,21 +15,26 @@ Attributes:
 		selection other than 'CLIPBOARD'.
 """
 
+import io
 import sys
+from threading import Lock
 from collections import OrderedDict
 from collections.abc import Mapping, Sequence
+from .history import ClipboardHistory
+from .snapshot import Snapshot
+# Platform backends are imported on first use, importing this package
+# doesn't load Xlib or touch the Windows clipboard API.
 if sys.platform.startswith('win32'):
-	from .winclipboard import WinClipboard
 	WINDOWS = True
 	LINUX = False
 else:
-	from .xclipboard import XSelection
 	WINDOWS = False
 	LINUX = True
 
 
-__all__ = ('Selection', 'get', 'set_text', 'get_text', 'set_with_rich_text',
-	'get_with_rich_text', 'clear', 'store', 'wrap_html', 'init')
+__all__ = ('Selection', 'AsyncSelection', 'ClipboardHistory', 'Snapshot',
+	'get', 'get_preferred', 'set_text', 'get_text', 'set_with_rich_text',
+	'get_with_rich_text', 'clear', 'store', 'watch', 'wrap_html', 'init')
 
 
 W_UNICODE = 'CF_UNICODETEXT'
@@ -45,6 +50,100 @@ UTF16 = 'utf-16le'
 SELECTION = None
 
 
+def _encode_text(text):
+	# Plaintext formats/targets of the platform, for set_text().
+	if not isinstance(text, (str, type(None))):
+		raise TypeError('text is not a str')
+	if WINDOWS:
+		if text:
+			text = text.encode(UTF16)
+		else:
+			text = ''.encode(UTF16)
+		return {W_UNICODE: text}
+	if text:
+		string = text.encode(ASCII, 'ignore')
+		text = text.encode(UTF8)
+	else:
+		string = ''.encode(ASCII, 'ignore')
+		text = ''.encode(UTF8)
+	return {L_TEXT: string, L_UNICODE: text}
+
+
+def _decode_text(content):
+	# Inverse of _encode_text(), content may lack any of the targets.
+	if WINDOWS:
+		data = content.get(W_UNICODE)
+		if data:
+			return data.decode(UTF16)
+		else:
+			return data
+	data = content.get(L_UNICODE)
+	if data:
+		try:
+			return data.decode(UTF8)
+		except UnicodeDecodeError:
+			return None
+	data = content.get(L_TEXT)
+	if data:
+		return data.decode(ASCII, 'ignore')
+	return None
+
+
+def _encode_rich_text(text, html, wrap_html):
+	# Plaintext and HTML formats/targets, for set_with_rich_text().
+	if not (isinstance(text, (str, type(None)))
+			and isinstance(html, (str, type(None)))):
+		raise TypeError('text or html is not str')
+	content = []
+	if WINDOWS:
+		if html:
+			html = wrap_html(html)
+			content.append((W_HTML, html))
+		if text:
+			text = text.encode(UTF16)
+			content.append((W_UNICODE, text))
+	else:
+		if text:
+			string = text.encode(ASCII, 'ignore')
+			content.append((L_TEXT, string))
+			text = text.encode(UTF8)
+			content.append((L_UNICODE, text))
+		if html:
+			html = html.encode(UTF8)
+			content.append((L_HTML, html))
+	return OrderedDict(content)
+
+
+def _decode_rich_text(content):
+	# Inverse of _encode_rich_text().
+	if WINDOWS:
+		html = content[W_HTML]
+		if html:
+			# Strip HTML Format additions and return just the fragment.
+			html = html.decode(UTF8)[131:-38]
+		text = content[W_UNICODE]
+		if text:
+			text = text.decode(UTF16)
+	else:
+		text = content[L_UNICODE]
+		if text:
+			text = text.decode(UTF8)
+		else:
+			text = content[L_TEXT]
+			if text:
+				text = text.decode(ASCII, 'ignore')
+		html = content[L_HTML]
+		if html:
+			try:
+				html = html.decode(UTF8)
+			except UnicodeDecodeError:
+				try:
+					html = html.decode(UTF16)
+				except UnicodeDecodeError:
+					html = html.decode(UTF8, 'ignore')
+	return (text, html)
+
+
 class Selection(object):
 	"""A selection object.
 
@@ -55,7 +154,10 @@ class Selection(object):
 		selection (str): The selection this object represents.
 	"""
 
-	def __init__(self, selection='CLIPBOARD'):
+	def __init__(
+		self, selection='CLIPBOARD', timeout=None, negotiate=False,
+		coalesce=None,
+	):
 		"""Initialize selection (clipboard).
 
 		Args:
@@ -64,28 +166,88 @@ class Selection(object):
 				Note:
 					On Windows selection defaults to 'CLIPBOARD' and this
 					argument is ignored.
+			timeout (float): Seconds :meth:`get` waits for the selection
+				owner to answer all requested targets. Targets still
+				unanswered after that are :obj:`None`. Defaults to 1 second.
+				Note:
+					This argument is ignored on Windows.
+			negotiate (bool): If true, read 'TARGETS' first and only request
+				formats/targets the owner offers, the rest are :obj:`None`
+				without waiting. The list is cached until the selection
+				changes hands where the X server supports XFixes.
+				:meth:`get_text` then only requests the first text target
+				offered.
+				Note:
+					This argument is ignored on Windows.
+			coalesce (float): If given, :meth:`set` returns without waiting
+				and calls within this many seconds of each other collapse to
+				the last one. Ownership is taken once, requests are always
+				answered with the newest content and ownership changes are
+				announced at most once per window. Meant for writers that
+				set the selection many times a second, e.g. 'PRIMARY' on
+				every cursor movement.
+				Note:
+					This argument is ignored on Windows.
 		"""
 
 		if WINDOWS:
 			self.selection = 'CLIPBOARD'
-			self._interface = WinClipboard()
 		else:
 			self.selection = selection
-			self._interface = XSelection(selection=selection)
-
-	def set(self, content):
+		self._timeout = timeout
+		self._negotiate = negotiate
+		self._coalesce = coalesce
+		self._backend = None
+		self._lock = Lock()
+
+	@property
+	def _interface(self):
+		# Backends connect lazily too: on Linux the X connection is opened
+		# by the first get() for reading and the first set() for writing.
+		if self._backend is None:
+			with self._lock:
+				if self._backend is None:
+					if WINDOWS:
+						from .winclipboard import WinClipboard
+						self._backend = WinClipboard()
+					else:
+						from .xclipboard import XSelection
+						self._backend = XSelection(
+							selection=self.selection,
+							timeout=self._timeout,
+							negotiate=self._negotiate,
+							coalesce=self._coalesce,
+						)
+		return self._backend
+
+	def set(self, content, force=False):
 		"""Set selection contents to content.
 
 		Args:
 			content (Mapping): A mapping where key is format/target and value
 				is data to set this format/target to. Value can be
-				:class:`str`, :class:`ByteString` or :obj:`None`.
+				:class:`str`, :class:`ByteString` or :obj:`None`, or a
+				callable without arguments returning one of those.
+				On Linux a callable is only called when the format/target
+				is first requested and its result is kept until selection
+				changes hands, on Windows it is called right away.
+				Value can also be a :class:`memoryview`, an :class:`mmap`,
+				a path (:class:`os.PathLike`, a :class:`str` is text) or a
+				binary file object. On Linux files are mapped into memory
+				and served from there as they're requested, without being
+				read in first. Files are read from the start, whole.
+			force (bool): On Linux, setting the exact text and bytes this
+				selection already owns does nothing, clipboard managers
+				aren't made to fetch it again. Set to true to take
+				ownership anyway. Ignored on Windows.
 		"""
 
-		if isinstance(content, Mapping):
+		if not isinstance(content, Mapping):
+			raise TypeError('content is not a Mapping')
+		if WINDOWS:
 			self._interface.set(content)
 		else:
-			raise TypeError('content is not a Mapping')
+			self._interface.set(content, force=force)
 
 	def get(self, targets):
 		"""Get the contents of specified formats/targets.
@@ -103,6 +265,10 @@ class Selection(object):
 				strings representing available formats/targets.
 				On Linux :class:`dict` is used, on Windows :class:`OrderedDict`
 				is used instead.
+				On Linux, while this process owns the selection, data is
+				returned straight from the content that was set: bytes as
+				they were given, without copying, other binary data copied
+				into bytes.
 		"""
 
 		if isinstance(targets, Sequence):
@@ -110,30 +276,61 @@ class Selection(object):
 		else:
 			raise TypeError('targets is not a Sequence')
 
-	def set_text(self, text):
+	def get_preferred(self, targets):
+		"""Get the first of the specified formats/targets that selection
+		offers.
+
+		Formats/targets not offered are not requested at all.
+
+		Args:
+			targets (Sequence): Formats/targets in order of preference.
+		Returns:
+			tuple: A tuple of the format/target (str) and its data (bytes),
+				or ``(None, None)`` if none of targets is available.
+		"""
+
+		if not isinstance(targets, Sequence):
+			raise TypeError('targets is not a Sequence')
+		if WINDOWS:
+			for target in targets:
+				data = self.get((target, ))[target]
+				if data is not None:
+					return target, data
+			return None, None
+		return self._interface.getPreferred(targets)
+
+	def open(self, target):
+		"""Open a format/target for reading as a binary stream.
+
+		On Linux data is read from the selection owner as the stream is
+		read, large content sent incrementally is never held in memory at
+		once. Use :meth:`get` for 'TARGETS'.
+
+		Args:
+			target (str): The format/target to read.
+		Returns:
+			A readable binary file object, or :obj:`None` if the selection
+			doesn't offer target. Close it when done.
+		"""
+
+		if not isinstance(target, str):
+			raise TypeError('target is not a str')
+		if target == 'TARGETS':
+			raise ValueError('Use get() to read TARGETS')
+		if WINDOWS:
+			data = self.get((target, ))[target]
+			return None if data is None else io.BytesIO(data)
+		return self._interface.open(target)
+
+	def set_text(self, text, force=False):
 		"""Set the plaintext formats/targets to text.
 
 		Args:
 			text (str): Text to set selection to.
+			force (bool): Take ownership even if unchanged, see :meth:`set`.
 		"""
 
-		if isinstance(text, (str, type(None))):
-			if WINDOWS:
-				if text:
-					text = text.encode(UTF16)
-				else:
-					text = ''.encode(UTF16)
-				self.set({W_UNICODE: text})
-			else:
-				if text:
-					string = text.encode(ASCII, 'ignore')
-					text = text.encode(UTF8)
-				else:
-					string = ''.encode(ASCII, 'ignore')
-					text = ''.encode(UTF8)
-				self.set({L_TEXT: string, L_UNICODE: text})
-		else:
-			raise TypeError('text is not a str')
+		self.set(_encode_text(text), force=force)
 
 	def get_text(self):
 		"""Get the contents of selection as plaintext.
@@ -144,27 +341,14 @@ class Selection(object):
 
 		if WINDOWS:
 			content = self.get((W_UNICODE, ))
-			data = content[W_UNICODE]
-			if data:
-				return data.decode(UTF16)
-			else:
-				return data
+		elif self._negotiate:
+			target, data = self.get_preferred((L_UNICODE, L_TEXT))
+			content = {target: data}
 		else:
 			content = self.get((L_TEXT, L_UNICODE))
-			data = content[L_UNICODE]
-			if data:
-				try:
-					return data.decode(UTF8)
-				except UnicodeDecodeError:
-					return None
-			else:
-				data = content[L_TEXT]
-				if data:
-					return data.decode(ASCII, 'ignore')
-				else:
-					return None
-
-	def set_with_rich_text(self, text, html):
+		return _decode_text(content)
+
+	def set_with_rich_text(self, text, html, force=False):
 		"""Set the plaintext and html rich text formats/targets to text and
 		html respectively.
 
@@ -175,30 +359,10 @@ class Selection(object):
 		Args:
 			text (str): Plain text to set selection to.
 			html (str): HTML formatted rich text to set selection to.
+			force (bool): Take ownership even if unchanged, see :meth:`set`.
 		"""
 
-		if (isinstance(text, (str, type(None)))
-				and isinstance(html, (str, type(None)))):
-			content = []
-			if WINDOWS:
-				if html:
-					html = self._interface.wrap_html(html)
-					content.append((W_HTML, html))
-				if text:
-					text = text.encode(UTF16)
-					content.append((W_UNICODE, text))
-			else:
-				if text:
-					string = text.encode(ASCII, 'ignore')
-					content.append((L_TEXT, string))
-					text = text.encode(UTF8)
-					content.append((L_UNICODE, text))
-				if html:
-					html = html.encode(UTF8)
-					content.append((L_HTML, html))
-			self.set(OrderedDict(content))
-		else:
-			raise TypeError('text or html is not str')
+		self.set(_encode_rich_text(text, html, self.wrap_html), force=force)
 
 	def get_with_rich_text(self):
 		"""Get the contents of the selection in plaintext and HTML formats.
@@ -211,32 +375,46 @@ class Selection(object):
 
 		if WINDOWS:
 			content = self.get((W_HTML, W_UNICODE))
-			html = content[W_HTML]
-			if html:
-				# Strip HTML Format additions and return just the fragment.
-				html = html.decode(UTF8)[131:-38]
-			text = content[W_UNICODE]
-			if text:
-				text = text.decode(UTF16)
 		else:
 			content = self.get((L_TEXT, L_UNICODE, L_HTML))
-			text = content[L_UNICODE]
-			if text:
-				text = text.decode(UTF8)
-			else:
-				text = content[L_TEXT]
-				if text:
-					text = text.decode(ASCII, 'ignore')
-			html = content[L_HTML]
-			if html:
-				try:
-					html = html.decode(UTF8)
-				except UnicodeDecodeError:
-					try:
-						html = html.decode(UTF16)
-					except UnicodeDecodeError:
-						html = html.decode(UTF8, 'ignore')
-		return (text, html)
+		return _decode_rich_text(content)
+
+	def snapshot(self, max_bytes=None, limits=None):
+		"""Copy every format/target selection offers.
+
+		On Linux 'TARGETS' is read first, unless cached for the current
+		owner, then all offered targets are fetched together, with
+		'MULTIPLE' where the owner supports it. Targets such as 'TARGETS'
+		or 'TIMESTAMP' that only describe the selection are left out.
+
+		Args:
+			max_bytes (int): Formats/targets larger than this many bytes
+				are left out. On Linux they're abandoned as soon as they're
+				known to be too large.
+			limits (Mapping): Format/target -> max_bytes for that one,
+				overrides max_bytes. 0 doesn't request it at all, :obj:`None`
+				means no limit.
+		Returns:
+			Snapshot: An immutable mapping of format/target -> bytes, pass
+				it to :meth:`restore` to set it again. Formats/targets the
+				owner failed to convert in time are left out.
+		"""
+
+		return Snapshot(
+			self.selection,
+			self._interface.snapshot(max_bytes=max_bytes, limits=limits),
+		)
+
+	def restore(self, snapshot, force=False):
+		"""Set selection to a snapshot taken by :meth:`snapshot`.
+
+		Args:
+			snapshot (Snapshot): The snapshot, its bytes are served as they
+				are.
+			force (bool): See :meth:`set`.
+		"""
+
+		self.set(snapshot, force=force)
 
 	def clear(self):
 		"""Empty selection.
@@ -254,6 +432,48 @@ class Selection(object):
 
 		self._interface.store()
 
+	def close(self):
+		"""Let go of the X connection.
+
+		Content this object owns is no longer offered. All objects in a
+		process share one X connection per display, it's closed once the
+		last one using it is. The object connects again if used after
+		this. Does nothing on Windows.
+		"""
+
+		with self._lock:
+			backend, self._backend = self._backend, None
+		if backend is not None and not WINDOWS:
+			backend.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def watch(self, callback=None, targets=None):
+		"""Watch selection for changes of ownership.
+
+		Note:
+			This method is Linux only and needs the XFIXES extension.
+			On Windows it raises :exc:`AttributeError`.
+		Args:
+			callback (callable, optional): Called with every change from a
+				thread of its own. Without it iterate the returned watcher,
+				which blocks until the next change.
+			targets (list, optional): Targets to fetch from the new owner,
+				as with :meth:`get`.
+		Returns:
+			An iterable watcher yielding ``SelectionChange(selection, owner,
+			timestamp, content)`` tuples. ``owner`` is None while nobody
+			owns the selection, ``content`` is None unless targets were
+			given. Call its ``close()`` method, or use it as a context
+			manager, to stop watching.
+		"""
+
+		return self._interface.watch(callback=callback, targets=targets)
+
 	def wrap_html(self, fragment):
 		"""Wrap HTML fragment so it complies with 'HTML Format' spec.
 
@@ -269,6 +489,202 @@ class Selection(object):
 		return self._interface.wrap_html(fragment)
 
 
+class AsyncSelection(object):
+	"""A selection object for use with :mod:`asyncio`.
+
+	Offers the same methods as :class:`Selection`, as coroutines.
+	On Linux these wait for the selection owner on the X connection's file
+	descriptor through the running event loop, without any threads. Asking
+	for the selection owner, interning new target names and taking
+	ownership are short blocking round trips to the X server on the loop's
+	thread. The connection belongs to the event loop the object is first
+	used from.
+	Any number of :meth:`get` calls may be in flight at once, cancelling
+	one, e.g. with :func:`asyncio.wait_for`, abandons its targets.
+	On Windows the clipboard is accessed directly, that never blocks.
+
+	Attributes:
+		selection (str): The selection this object represents.
+	"""
+
+	def __init__(
+		self, selection='CLIPBOARD', timeout=None, negotiate=False,
+		coalesce=None,
+	):
+		"""Initialize selection (clipboard).
+
+		Args:
+			selection (str): Selection to init, see :class:`Selection`.
+			timeout (float): Seconds :meth:`get` waits for the selection
+				owner, see :class:`Selection`.
+			negotiate (bool): Read 'TARGETS' first, see :class:`Selection`.
+			coalesce (float): Collapse rapid :meth:`set` calls, see
+				:class:`Selection`.
+		"""
+
+		if WINDOWS:
+			self.selection = 'CLIPBOARD'
+		else:
+			self.selection = selection
+		self._timeout = timeout
+		self._negotiate = negotiate
+		self._coalesce = coalesce
+		self._backend = None
+		self._lock = Lock()
+
+	@property
+	def _interface(self):
+		if self._backend is None:
+			with self._lock:
+				if self._backend is None:
+					if WINDOWS:
+						from .winclipboard import WinClipboard
+						self._backend = WinClipboard()
+					else:
+						from .xclipboard import AsyncXSelection
+						self._backend = AsyncXSelection(
+							selection=self.selection,
+							timeout=self._timeout,
+							negotiate=self._negotiate,
+							coalesce=self._coalesce,
+						)
+		return self._backend
+
+	async def set(self, content, force=False):
+		"""Set selection contents to content, see :meth:`Selection.set`.
+		"""
+
+		if not isinstance(content, Mapping):
+			raise TypeError('content is not a Mapping')
+		if WINDOWS:
+			self._interface.set(content)
+		else:
+			self._interface.set(content, force=force)
+
+	async def get(self, targets):
+		"""Get the contents of specified formats/targets, see
+		:meth:`Selection.get`.
+		"""
+
+		if not isinstance(targets, Sequence):
+			raise TypeError('targets is not a Sequence')
+		if WINDOWS:
+			return self._interface.get(targets)
+		return await self._interface.get(targets)
+
+	async def get_preferred(self, targets):
+		"""Get the first of the specified formats/targets that selection
+		offers, see :meth:`Selection.get_preferred`.
+		"""
+
+		if not isinstance(targets, Sequence):
+			raise TypeError('targets is not a Sequence')
+		if WINDOWS:
+			for target in targets:
+				data = self._interface.get((target, ))[target]
+				if data is not None:
+					return target, data
+			return None, None
+		return await self._interface.getPreferred(targets)
+
+	async def set_text(self, text, force=False):
+		"""Set the plaintext formats/targets to text.
+		"""
+
+		await self.set(_encode_text(text), force=force)
+
+	async def get_text(self):
+		"""Get the contents of selection as plaintext.
+		"""
+
+		if WINDOWS:
+			content = await self.get((W_UNICODE, ))
+		elif self._negotiate:
+			target, data = await self.get_preferred((L_UNICODE, L_TEXT))
+			content = {target: data}
+		else:
+			content = await self.get((L_TEXT, L_UNICODE))
+		return _decode_text(content)
+
+	async def set_with_rich_text(self, text, html, force=False):
+		"""Set the plaintext and html rich text formats/targets, see
+		:meth:`Selection.set_with_rich_text`.
+		"""
+
+		await self.set(
+			_encode_rich_text(text, html, self.wrap_html), force=force
+		)
+
+	async def get_with_rich_text(self):
+		"""Get the contents of the selection in plaintext and HTML formats,
+		see :meth:`Selection.get_with_rich_text`.
+		"""
+
+		if WINDOWS:
+			content = await self.get((W_HTML, W_UNICODE))
+		else:
+			content = await self.get((L_TEXT, L_UNICODE, L_HTML))
+		return _decode_rich_text(content)
+
+	async def snapshot(self, max_bytes=None, limits=None):
+		"""Copy every format/target selection offers, see
+		:meth:`Selection.snapshot`.
+		"""
+
+		if WINDOWS:
+			content = self._interface.snapshot(max_bytes=max_bytes, limits=limits)
+		else:
+			content = await self._interface.snapshot(
+				max_bytes=max_bytes, limits=limits
+			)
+		return Snapshot(self.selection, content)
+
+	async def restore(self, snapshot, force=False):
+		"""Set selection to a snapshot, see :meth:`Selection.restore`.
+		"""
+
+		await self.set(snapshot, force=force)
+
+	async def clear(self):
+		"""Empty selection.
+		"""
+
+		self._interface.clear()
+
+	async def store(self):
+		"""Store selection contents so they're available after script exits.
+
+		Note:
+			This method is Linux only and only works for 'CLIPBOARD' selection.
+			On Windows it raises :exc:`AttributeError`.
+		"""
+
+		self._interface.store()
+
+	def close(self):
+		"""Let go of the X connection, see :meth:`Selection.close`.
+		Call it from the event loop the object was used from.
+		"""
+
+		with self._lock:
+			backend, self._backend = self._backend, None
+		if backend is not None and not WINDOWS:
+			backend.close()
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc_info):
+		self.close()
+
+	def wrap_html(self, fragment):
+		"""Wrap HTML fragment so it complies with 'HTML Format' spec, see
+		:meth:`Selection.wrap_html`.
+		"""
+
+		return self._interface.wrap_html(fragment)
+
+
 def init(selection='CLIPBOARD'):
 	"""Initialize module-level selection object with a given selection.
 
@@ -282,19 +698,23 @@ def init(selection='CLIPBOARD'):
 	SELECTION = Selection(selection=selection)
 
 
-def set(content):
+def set(content, force=False):
 	"""Set selection contents to content.
 
 	Args:
 		content (Mapping): A mapping where key is format/target and value
 			is data to set this format/target to. Value can be
-			:class:`str`, :class:`ByteString` or :obj:`None`.
+			:class:`str`, :class:`ByteString` or :obj:`None`, a callable
+			returning one of those, a path or a file, see
+			:meth:`Selection.set`.
+		force (bool): Take ownership even if unchanged, see
+			:meth:`Selection.set`.
 	"""
 
 	global SELECTION
 	if SELECTION is None:
 		SELECTION = Selection()
-	SELECTION.set(content)
+	SELECTION.set(content, force=force)
 
 
 def get(targets):
@@ -321,17 +741,37 @@ def get(targets):
 	return SELECTION.get(targets)
 
 
-def set_text(text):
+def get_preferred(targets):
+	"""Get the first of the specified formats/targets that selection offers.
+
+	Formats/targets not offered are not requested at all.
+
+	Args:
+		targets (Sequence): Formats/targets in order of preference.
+	Returns:
+		tuple: A tuple of the format/target (str) and its data (bytes),
+			or ``(None, None)`` if none of targets is available.
+	"""
+
+	global SELECTION
+	if SELECTION is None:
+		SELECTION = Selection()
+	return SELECTION.get_preferred(targets)
+
+
+def set_text(text, force=False):
 	"""Set the plaintext formats/targets to text.
 
 	Args:
 		text (str): Text to set selection to.
+		force (bool): Take ownership even if unchanged, see
+			:meth:`Selection.set`.
 	"""
 
 	global SELECTION
 	if SELECTION is None:
 		SELECTION = Selection()
-	SELECTION.set_text(text)
+	SELECTION.set_text(text, force=force)
 
 
 def get_text():
@@ -347,7 +787,7 @@ def get_text():
 	return SELECTION.get_text()
 
 
-def set_with_rich_text(text, html):
+def set_with_rich_text(text, html, force=False):
 	"""Set the plaintext and html rich text formats/targets to text and
 	html respectively.
 
@@ -358,12 +798,14 @@ def set_with_rich_text(text, html):
 	Args:
 		text (str): Plain text to set selection to.
 		html (str): HTML formatted rich text to set selection to.
+		force (bool): Take ownership even if unchanged, see
+			:meth:`Selection.set`.
 	"""
 
 	global SELECTION
 	if SELECTION is None:
 		SELECTION = Selection()
-	SELECTION.set_with_rich_text(text, html)
+	SELECTION.set_with_rich_text(text, html, force=force)
 
 
 def get_with_rich_text():
@@ -405,6 +847,26 @@ def store():
 	SELECTION.store()
 
 
+def watch(callback=None, targets=None):
+	"""Watch selection for changes of ownership.
+
+	Note:
+		This method is Linux only and needs the XFIXES extension.
+		On Windows it raises :exc:`AttributeError`.
+	Args:
+		callback (callable, optional): Called with every change from a
+			thread of its own. Without it iterate the returned watcher.
+		targets (list, optional): Targets to fetch from the new owner.
+	Returns:
+		An iterable watcher, see :meth:`Selection.watch`.
+	"""
+
+	global SELECTION
+	if SELECTION is None:
+		SELECTION = Selection()
+	return SELECTION.watch(callback=callback, targets=targets)
+
+
 def wrap_html(fragment):
 	"""Wrap HTML fragment so it complies with 'HTML Format' spec.
 
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+
+"""Clipboard history with deduplicated payloads.
+
+:class:`ClipboardHistory` records selection contents as entries. Every
+payload is kept once by content hash, however many entries and targets
+share it, and the least recently used entries are evicted once payloads
+take more than a byte budget. Given a path, payloads are also appended to
+an on-disk store: eviction then only drops them from memory, they're read
+back when needed and the history survives restarts::
+
+	from klembord import Selection, ClipboardHistory
+
+	selection = Selection()
+	history = ClipboardHistory(path='history.klembord')
+	watcher = history.follow(selection)
+	...
+	history.activate(history.entries()[1], selection)
+"""
+
+import os
+import struct
+import hashlib
+from threading import Lock
+from functools import partial
+from collections import OrderedDict
+from collections.abc import ByteString
+from .snapshot import META_TARGETS
+
+
+# Store records: a payload, an entry listing (target, payload digest)
+# pairs, or an entry forgotten. Entries recorded again are appended again,
+# the last one wins.
+BLOB = b'B'
+BLOB_HEADER = struct.Struct('=16sQ')
+ENTRY = b'E'
+ENTRY_HEADER = struct.Struct('=QI')
+ENTRY_TARGET = struct.Struct('=H16s')
+FORGET = b'F'
+FORGET_HEADER = struct.Struct('=Q')
+
+
+class Blob(object):
+	# One payload. data is None while it's only on disk.
+	__slots__ = ('size', 'data', 'offset', 'refs')
+
+	def __init__(self, size, data=None, offset=None):
+		self.size = size
+		self.data = data
+		self.offset = offset
+		self.refs = 0
+
+
+class ClipboardHistory(object):
+	"""Past selection contents, deduplicated by content hash.
+
+	All methods are thread-safe, :meth:`follow` records from a watcher's
+	thread.
+
+	Attributes:
+		max_bytes (int): Budget for payloads kept in memory.
+		path (str): The on-disk store, :obj:`None` if there isn't one.
+	"""
+
+	def __init__(self, max_bytes=64 * 1024 * 1024, path=None):
+		"""Initialize history, loading the store at path if there is one.
+
+		Args:
+			max_bytes (int): Payloads kept in memory may take up to this
+				many bytes. Past that, without a store the least recently
+				used entries are forgotten, with one the least recently used
+				payloads are dropped from memory and read back when needed.
+			path (str, PathLike): Append-only file to store payloads and
+				entries in. Created if it doesn't exist.
+		"""
+
+		self.max_bytes = max_bytes
+		self.path = path
+		self._lock = Lock()
+		# Digest -> Blob
+		self._blobs = {}
+		# Digests of payloads in memory, least recently used first.
+		self._resident = OrderedDict()
+		self._memory = 0
+		# Entry id -> ((target, digest), ...), least recently used first.
+		self._entries = OrderedDict()
+		# frozenset of an entry's (target, digest) pairs -> entry id
+		self._ids = {}
+		self._next_id = 1
+		self._store = None
+		if path is not None:
+			self._store = open(path, 'a+b')
+			try:
+				self._load()
+			except Exception:
+				self._store.close()
+				raise
+
+	def __len__(self):
+		with self._lock:
+			return len(self._entries)
+
+	def __contains__(self, entry_id):
+		with self._lock:
+			return entry_id in self._entries
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	@property
+	def memory(self):
+		"""int: Bytes of payloads currently kept in memory."""
+
+		return self._memory
+
+	def entries(self):
+		"""List entries, most recently used first.
+
+		Returns:
+			list: Entry ids.
+		"""
+
+		with self._lock:
+			return list(reversed(self._entries))
+
+	def record(self, content):
+		"""Record content as the most recent entry.
+
+		Args:
+			content (Mapping): Target -> data, as returned by
+				:meth:`klembord.Selection.get`. :class:`str` is stored
+				encoded in UTF-8, targets without data and targets such as
+				'TARGETS' that only describe the selection are skipped.
+		Returns:
+			int: Id of the entry, the existing one if the same content was
+			recorded before. :obj:`None` if there was nothing to record.
+		"""
+
+		payloads = []
+		for target, data in content.items():
+			if target in META_TARGETS or data is None:
+				continue
+			if isinstance(data, str):
+				data = data.encode()
+			elif isinstance(data, (ByteString, memoryview)):
+				data = bytes(data)
+			else:
+				raise TypeError('Unsupported data type:\n{}'.format(repr(data)))
+			digest = hashlib.blake2b(data, digest_size=16).digest()
+			payloads.append((target, data, digest))
+		if not payloads:
+			return None
+		targets = tuple((target, digest) for target, _, digest in payloads)
+		with self._lock:
+			entry_id = self._ids.get(frozenset(targets))
+			if entry_id is None:
+				entry_id = self._next_id
+				self._next_id += 1
+				for target, data, digest in payloads:
+					blob = self._blobs.get(digest)
+					if blob is None:
+						blob = self._blobs[digest] = Blob(len(data))
+						if self._store is not None:
+							blob.offset = self._appendBlob(digest, data)
+					blob.refs += 1
+					self._keep(digest, blob, data)
+				self._entries[entry_id] = targets
+				self._ids[frozenset(targets)] = entry_id
+			else:
+				# Recording it again makes it the most recent.
+				self._entries.move_to_end(entry_id)
+				for target, data, digest in payloads:
+					self._keep(digest, self._blobs[digest], data)
+			if self._store is not None:
+				self._appendEntry(entry_id, targets)
+			self._evict()
+			return entry_id
+
+	def content(self, entry_id):
+		"""Read an entry.
+
+		Args:
+			entry_id (int): The entry.
+		Returns:
+			dict: Target -> :class:`bytes`, payloads evicted from memory are
+			read from the store.
+		Raises:
+			KeyError: There's no such entry.
+		"""
+
+		with self._lock:
+			targets = self._entries[entry_id]
+		return {target: self._read(digest) for target, digest in targets}
+
+	def activate(self, entry_id, selection):
+		"""Set selection to an entry and make it the most recent.
+
+		Payloads in memory are handed over as they are, those only on disk
+		as callables reading them, which the Linux backend only calls when
+		a paste asks for that target. Nothing is copied or hashed again:
+		the selection is set with ``force=True``, so it takes ownership
+		even if it already holds the entry.
+
+		Args:
+			entry_id (int): The entry.
+			selection (klembord.Selection): Selection to set.
+		Raises:
+			KeyError: There's no such entry.
+		"""
+
+		with self._lock:
+			targets = self._entries[entry_id]
+			self._entries.move_to_end(entry_id)
+			if self._store is not None:
+				self._appendEntry(entry_id, targets)
+			content = OrderedDict()
+			for target, digest in targets:
+				data = self._blobs[digest].data
+				if data is None:
+					data = partial(self._read, digest)
+				else:
+					self._resident.move_to_end(digest)
+				content[target] = data
+		# Without force the Linux backend hashes every payload to compare it
+		# with what the selection holds.
+		selection.set(content, force=True)
+
+	def follow(self, selection, targets=('UTF8_STRING', 'text/html')):
+		"""Record every change of selection's content.
+
+		Note:
+			This method is Linux only, see :meth:`klembord.Selection.watch`.
+		Args:
+			selection (klembord.Selection): Selection to follow.
+			targets (list): Targets to record from every new owner.
+		Returns:
+			The watcher, close it to stop following.
+		"""
+
+		def record(change):
+			if change.content:
+				self.record(change.content)
+
+		return selection.watch(callback=record, targets=targets)
+
+	def forget(self, entry_id):
+		"""Drop an entry. Payloads no other entry uses are dropped with
+		it, though they stay in the append-only store.
+
+		Args:
+			entry_id (int): The entry.
+		Raises:
+			KeyError: There's no such entry.
+		"""
+
+		with self._lock:
+			self._forget(entry_id)
+			if self._store is not None:
+				self._store.seek(0, os.SEEK_END)
+				self._store.write(FORGET + FORGET_HEADER.pack(entry_id))
+				self._store.flush()
+
+	def close(self):
+		"""Close the store, if there is one."""
+
+		with self._lock:
+			if self._store is not None:
+				self._store.close()
+				self._store = None
+
+	def _forget(self, entry_id):
+		targets = self._entries.pop(entry_id)
+		del self._ids[frozenset(targets)]
+		for target, digest in targets:
+			blob = self._blobs[digest]
+			blob.refs -= 1
+			if not blob.refs:
+				del self._blobs[digest]
+				if self._resident.pop(digest, None) is not None:
+					self._memory -= blob.size
+
+	def _keep(self, digest, blob, data):
+		# Puts payload in memory as the most recently used one.
+		if blob.data is None:
+			blob.data = data
+			self._memory += blob.size
+		self._resident[digest] = blob
+		self._resident.move_to_end(digest)
+
+	def _evict(self):
+		while self._memory > self.max_bytes:
+			if self._store is not None:
+				_, blob = self._resident.popitem(last=False)
+				blob.data = None
+				self._memory -= blob.size
+			elif len(self._entries) > 1:
+				self._forget(next(iter(self._entries)))
+			else:
+				# The entry just recorded stays, whatever its size.
+				break
+
+	def _read(self, digest):
+		with self._lock:
+			blob = self._blobs.get(digest)
+			if blob is None:
+				# Forgotten since a callable was handed out for it.
+				return None
+			if blob.data is not None:
+				self._resident.move_to_end(digest)
+				return blob.data
+			if self._store is None:
+				raise ValueError('History store is closed')
+			self._store.seek(blob.offset)
+			data = self._store.read(blob.size)
+			if len(data) != blob.size:
+				raise ValueError('History store is truncated')
+			self._keep(digest, blob, data)
+			self._evict()
+			return data
+
+	def _appendBlob(self, digest, data):
+		# Returns the offset data is stored at.
+		store = self._store
+		store.seek(0, os.SEEK_END)
+		store.write(BLOB)
+		store.write(BLOB_HEADER.pack(digest, len(data)))
+		offset = store.tell()
+		store.write(data)
+		store.flush()
+		return offset
+
+	def _appendEntry(self, entry_id, targets):
+		record = [ENTRY, ENTRY_HEADER.pack(entry_id, len(targets))]
+		for target, digest in targets:
+			name = target.encode()
+			record.append(ENTRY_TARGET.pack(len(name), digest))
+			record.append(name)
+		self._store.seek(0, os.SEEK_END)
+		self._store.write(b''.join(record))
+		self._store.flush()
+
+	def _load(self):
+		# Replays the store. A record cut short, say by a crash while it
+		# was written, is truncated along with everything after it.
+		store = self._store
+		size = os.fstat(store.fileno()).st_size
+		store.seek(0)
+		end = 0
+
+		def read(length):
+			data = store.read(length)
+			if len(data) != length:
+				raise ValueError('Truncated record')
+			return data
+
+		while end < size:
+			try:
+				kind = read(1)
+				if kind == BLOB:
+					digest, length = BLOB_HEADER.unpack(read(BLOB_HEADER.size))
+					offset = store.tell()
+					if offset + length > size:
+						raise ValueError('Truncated record')
+					store.seek(length, os.SEEK_CUR)
+					if digest not in self._blobs:
+						self._blobs[digest] = Blob(length, offset=offset)
+				elif kind == ENTRY:
+					entry_id, count = ENTRY_HEADER.unpack(read(ENTRY_HEADER.size))
+					targets = []
+					for _ in range(count):
+						length, digest = ENTRY_TARGET.unpack(
+							read(ENTRY_TARGET.size)
+						)
+						targets.append((read(length).decode(), digest))
+					targets = tuple(targets)
+					self._entries[entry_id] = targets
+					self._entries.move_to_end(entry_id)
+					self._next_id = max(self._next_id, entry_id + 1)
+				elif kind == FORGET:
+					entry_id, = FORGET_HEADER.unpack(read(FORGET_HEADER.size))
+					self._entries.pop(entry_id, None)
+				else:
+					raise ValueError('Unknown record')
+			except (ValueError, UnicodeDecodeError):
+				break
+			end = store.tell()
+		if end < size:
+			store.truncate(end)
+		for entry_id, targets in list(self._entries.items()):
+			if not all(digest in self._blobs for _, digest in targets):
+				del self._entries[entry_id]
+				continue
+			self._ids[frozenset(targets)] = entry_id
+			for _, digest in targets:
+				self._blobs[digest].refs += 1
+		for digest, blob in list(self._blobs.items()):
+			if not blob.refs:
+				del self._blobs[digest]
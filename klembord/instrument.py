@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""Instrumentation hooks for klembord's Linux backend.
+
+Set a :class:`Hook` with :func:`set_hook` to receive counters, latencies,
+spans and errors from :mod:`klembord.xclipboard`. Without a hook nothing is
+measured, every instrumented spot costs a single ``None`` check.
+
+:class:`Collector` is a hook keeping everything in memory::
+
+	from klembord import instrument
+
+	collector = instrument.Collector()
+	instrument.set_hook(collector)
+	...
+	print(collector.snapshot())
+
+Spans:
+	'get', 'set', 'store', 'snapshot': The :class:`klembord.Selection`
+		methods.
+	'serve': Answering one SelectionRequest while we own the selection.
+	'reconnect.getter', 'reconnect.setter': Replacing a getter or setter
+		after its X connection broke.
+
+Counters:
+	'get.local': get() answered from content we own ourselves.
+	'get.targets', 'get.unanswered': Targets requested from the owner, and
+		those it didn't answer in time.
+	'bytes.received', 'bytes.sent': Payload bytes fetched and served.
+	'serve.refused': Requests refused, we no longer owned the selection.
+	'incr.expired': INCR transfers dropped because the other side stalled.
+
+Latencies:
+	'owner.response': Seconds the owner took to answer a get().
+	Every span is also observed as a latency under its own name.
+
+Attributes:
+	hook (Hook): The hook in use, :obj:`None` by default.
+"""
+
+import time
+import asyncio
+import functools
+from bisect import bisect_left
+from threading import Lock
+
+
+hook = None
+
+
+def set_hook(new_hook):
+	"""Set the hook instrumented code reports to.
+
+	Args:
+		new_hook (Hook): The hook, or :obj:`None` to stop instrumenting.
+	Returns:
+		Hook: The previous hook.
+	"""
+
+	global hook
+	old_hook, hook = hook, new_hook
+	return old_hook
+
+
+class Hook(object):
+	"""Base class of instrumentation hooks, every method does nothing.
+
+	Methods are called from whichever thread did the work, including the
+	X connection's event thread, so they should be quick and thread-safe.
+	"""
+
+	def count(self, name, value=1):
+		"""Add value to counter name."""
+
+	def observe(self, name, seconds):
+		"""Record a latency of seconds for name."""
+
+	def span_start(self, name):
+		"""Span name started on the calling thread."""
+
+	def span_end(self, name, seconds, error):
+		"""Span name ended after seconds, error is the exception it raised
+		or :obj:`None`."""
+
+	def error(self, error):
+		"""An exception was handled inside klembord."""
+
+
+class Span(object):
+	# Reports one span to hook, as a context manager.
+
+	def __init__(self, hook, name):
+		self.hook = hook
+		self.name = name
+		self.start = None
+
+	def __enter__(self):
+		self.hook.span_start(self.name)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		seconds = time.perf_counter() - self.start
+		self.hook.span_end(self.name, seconds, exc_value)
+		self.hook.observe(self.name, seconds)
+
+
+def spanned(name):
+	# Decorator reporting every call as span name, if there's a hook.
+	def decorate(function):
+		if asyncio.iscoroutinefunction(function):
+			@functools.wraps(function)
+			async def wrapper(*args, **kwargs):
+				current = hook
+				if current is None:
+					return await function(*args, **kwargs)
+				with Span(current, name):
+					return await function(*args, **kwargs)
+		else:
+			@functools.wraps(function)
+			def wrapper(*args, **kwargs):
+				current = hook
+				if current is None:
+					return function(*args, **kwargs)
+				with Span(current, name):
+					return function(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+class Histogram(object):
+	# Latencies in fixed buckets, by upper bound in seconds.
+	BOUNDS = (
+		0.0001, 0.00025, 0.0005,
+		0.001, 0.0025, 0.005,
+		0.01, 0.025, 0.05,
+		0.1, 0.25, 0.5,
+		1.0, 2.5, 5.0, 10.0,
+		float('inf'),
+	)
+
+	def __init__(self):
+		self.buckets = [0] * len(self.BOUNDS)
+		self.count = 0
+		self.sum = 0.0
+		self.min = None
+		self.max = None
+
+	def observe(self, seconds):
+		self.buckets[bisect_left(self.BOUNDS, seconds)] += 1
+		self.count += 1
+		self.sum += seconds
+		if self.min is None or seconds < self.min:
+			self.min = seconds
+		if self.max is None or seconds > self.max:
+			self.max = seconds
+
+	def snapshot(self):
+		return {
+			'count': self.count,
+			'sum': self.sum,
+			'min': self.min,
+			'max': self.max,
+			'buckets': dict(zip(self.BOUNDS, self.buckets)),
+		}
+
+
+class Collector(Hook):
+	"""A hook keeping counters, latency histograms, active spans and error
+	counts in memory.
+	"""
+
+	def __init__(self):
+		self._lock = Lock()
+		self.reset()
+
+	def reset(self):
+		"""Forget everything collected so far."""
+
+		with self._lock:
+			self._counters = {}
+			self._histograms = {}
+			self._active = {}
+			self._errors = {}
+
+	def count(self, name, value=1):
+		with self._lock:
+			self._counters[name] = self._counters.get(name, 0) + value
+
+	def observe(self, name, seconds):
+		with self._lock:
+			histogram = self._histograms.get(name)
+			if histogram is None:
+				histogram = self._histograms[name] = Histogram()
+			histogram.observe(seconds)
+
+	def span_start(self, name):
+		with self._lock:
+			self._active[name] = self._active.get(name, 0) + 1
+
+	def span_end(self, name, seconds, error):
+		with self._lock:
+			self._active[name] -= 1
+			if error is not None:
+				name = '{}.errors'.format(name)
+				self._counters[name] = self._counters.get(name, 0) + 1
+
+	def error(self, error):
+		name = type(error).__name__
+		with self._lock:
+			self._errors[name] = self._errors.get(name, 0) + 1
+
+	def snapshot(self):
+		"""Take a consistent copy of everything collected so far.
+
+		Returns:
+			dict: 'counters' (name -> int), 'latencies' (name -> dict with
+				'count', 'sum', 'min', 'max' and 'buckets', which maps upper
+				bounds in seconds to counts), 'active_spans' (name -> int)
+				and 'errors' (exception type name -> int).
+		"""
+
+		with self._lock:
+			return {
+				'counters': dict(self._counters),
+				'latencies': {
+					name: histogram.snapshot()
+					for name, histogram in self._histograms.items()
+				},
+				'active_spans': dict(self._active),
+				'errors': dict(self._errors),
+			}
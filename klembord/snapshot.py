@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Selection snapshots.
+
+:meth:`klembord.Selection.snapshot` returns a :class:`Snapshot` of every
+format/target the selection offers, :meth:`klembord.Selection.restore` sets
+it again::
+
+	saved = selection.snapshot(max_bytes=16 * 1024 * 1024)
+	selection.set_text('temporary')
+	...
+	selection.restore(saved)
+
+Attributes:
+	META_TARGETS (frozenset): Targets describing the selection rather than
+		holding content, never part of a snapshot or history entry.
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+META_TARGETS = frozenset((
+	'TARGETS',
+	'MULTIPLE',
+	'SAVE_TARGETS',
+	'TIMESTAMP',
+	'DELETE',
+	'INSERT_SELECTION',
+	'INSERT_PROPERTY',
+))
+
+
+class Snapshot(Mapping):
+	"""An immutable copy of a selection's content.
+
+	A read-only mapping of format/target -> :class:`bytes`, in the order
+	the owner offered them. Equal payloads, say 'UTF8_STRING' and 'STRING'
+	holding the same text, are stored once.
+
+	Attributes:
+		selection (str): The selection it was taken from.
+	"""
+
+	__slots__ = ('selection', '_content')
+
+	def __init__(self, selection, content):
+		self.selection = selection
+		self._content = content
+
+	def __getitem__(self, target):
+		return self._content[target]
+
+	def __iter__(self):
+		return iter(self._content)
+
+	def __len__(self):
+		return len(self._content)
+
+	def __repr__(self):
+		return '<Snapshot of {} with {} targets, {} bytes>'.format(
+			self.selection, len(self), self.size
+		)
+
+	@property
+	def size(self):
+		"""int: Bytes of payloads held, shared ones counted once."""
+
+		payloads = {id(data): data for data in self._content.values()}
+		return sum(len(data) for data in payloads.values())
+
+
+def requested_sizes(offered, max_bytes, limits):
+	# Target -> the most bytes a snapshot keeps of it, None for no limit.
+	# Meta targets and targets limited to 0 bytes aren't requested at all.
+	sizes = OrderedDict()
+	for target in offered:
+		if target in META_TARGETS:
+			continue
+		limit = max_bytes
+		if limits is not None:
+			limit = limits.get(target, max_bytes)
+		if limit != 0:
+			sizes[target] = limit
+	return sizes
+
+
+def kept_content(content, sizes):
+	# What arrived within its limit, as bytes in the offered order.
+	snapshot = OrderedDict()
+	seen = {}
+	for target, limit in sizes.items():
+		data = content.get(target)
+		if data is None or (limit is not None and len(data) > limit):
+			continue
+		data = bytes(data)
+		snapshot[target] = seen.setdefault(data, data)
+	return snapshot
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
+import os
+from mmap import mmap
 from collections import OrderedDict
 from collections.abc import ByteString
 from ctypes import windll, create_unicode_buffer, memmove, c_uint, c_wchar
 from ctypes import c_void_p, c_bool, c_int, c_byte
+from .snapshot import requested_sizes, kept_content
 
 
 UNSUPPORTED = {
@@ -145,6 +148,17 @@ class WinClipboard(object):
 
 		formats = OrderedDict()
 		for target, data in content.items():
+			# No delayed rendering here, providers are called right away.
+			if callable(data):
+				data = data()
+			# The clipboard takes a copy in global memory anyway.
+			if isinstance(data, os.PathLike):
+				with open(data, 'rb') as source:
+					data = source.read()
+			elif isinstance(data, (mmap, memoryview)):
+				data = bytes(data)
+			elif hasattr(data, 'read'):
+				data = data.read()
 			if not isinstance(data, (str, ByteString, type(None))):
 				raise TypeError('Unsupported data type:\n{}'.format(repr(data)))
 			if target in UNSUPPORTED:
@@ -175,6 +189,17 @@ class WinClipboard(object):
 		else:
 			raise RuntimeError('Failed to open clipboard')
 
+	def snapshot(self, max_bytes=None, limits=None):
+
+		offered = self.get(('TARGETS', ))['TARGETS']
+		sizes = requested_sizes(
+			(target for target in offered if target not in UNSUPPORTED),
+			max_bytes,
+			limits,
+		)
+		content = self.get(tuple(sizes)) if sizes else {}
+		return kept_content(content, sizes)
+
 	def clear(self):
 
 		if windll.user32.OpenClipboard(None):
@@ -1,18 +1,36 @@
 #!/usr/bin/env python3
 
+import os
+import io
 import time
 import sys
-from threading import Thread
+import mmap
+import stat
+import struct
+import select
+import hashlib
+import asyncio
+from threading import Thread, Lock, get_ident
+from concurrent.futures import Future, wait
+from concurrent.futures import TimeoutError as FutureTimeout
 from queue import Queue, Empty
+from collections import namedtuple
 from collections.abc import ByteString
 from traceback import print_exception
 from Xlib import X, display, Xatom
-from Xlib.protocol import event
-from Xlib.error import CatchError, BadAtom
-from stopit import ThreadingTimeout
+from Xlib.protocol import event, request
+from Xlib.ext import xfixes
+from Xlib.error import CatchError, BadAtom, XError
+from . import instrument
+from .instrument import spanned
+from .snapshot import requested_sizes, kept_content
 
 
+# For requests nobody checks the outcome of. Whatever is checked gets a
+# CatchError of its own, this one is never reset.
 errHandler = CatchError()
+# Longest property we ever ask for in one GetProperty, in 32-bit units.
+PROPERTY_LENGTH = 0x1FFFFFFF
 
 
 class ErrorReporter(object):
@@ -20,6 +38,8 @@ class ErrorReporter(object):
 
 	@classmethod
 	def print(cls, error):
+		if instrument.hook is not None:
+			instrument.hook.error(error)
 		if cls.debug:
 			print_exception(error.__class__, error, error.__traceback__)
 
@@ -28,490 +48,2272 @@ class BrokenConnection(Exception):
 	pass
 
 
-class XGetter(Thread):
+class XReactor(object):
+	# Blocks on the display socket and a wake-up pipe instead of sleeping
+	# between polls. Setting poll_interval restores the old sleep-polling
+	# behaviour, it's only kept around so benchmarks can compare the two.
+	poll_interval = None
 
-	def __init__(self, selection='CLIPBOARD'):
-		super().__init__(name='klembord XGetter', daemon=True)
-		self.selection = selection
+	def __init__(self, display):
+		self.display = display
+		self.fileno = display.fileno()
+		self._wake_r, self._wake_w = os.pipe()
+		os.set_blocking(self._wake_r, False)
+		os.set_blocking(self._wake_w, False)
+
+	def wakeup(self):
+		# Must also be called after any I/O done from another thread,
+		# Xlib may have read and queued events while flushing or waiting
+		# for a reply, leaving nothing to read on the socket.
+		try:
+			os.write(self._wake_w, b'\0')
+		except OSError:
+			# Pipe is full or closed, either way nobody needs waking.
+			pass
+
+	def flush(self):
+		try:
+			self.display.flush()
+		finally:
+			self.wakeup()
+
+	def events(self):
+		while self.display.pending_events():
+			yield self.display.next_event()
+
+	def readers(self):
+		return (self.fileno, self._wake_r)
+
+	def drain(self):
+		try:
+			while os.read(self._wake_r, 512):
+				pass
+		except OSError:
+			pass
+
+	def wait(self, timeout=None):
+		if self.poll_interval is not None:
+			time.sleep(self.poll_interval)
+			return
+		readable, _, _ = select.select(self.readers(), (), (), timeout)
+		if self._wake_r in readable:
+			self.drain()
+
+	def close(self):
+		os.close(self._wake_r)
+		os.close(self._wake_w)
+
+
+class XConnection(Thread):
+	# One X connection and one event thread per display, shared by every
+	# XGetter and XSetter in the process. Getters and setters register their
+	# windows and get the events addressed to them, plus PropertyNotify
+	# events on foreign windows, which setters need for INCR. Connections
+	# are reference counted: open() returns the shared one and the last
+	# close() shuts it down.
+	connections = {}  # type: dict
+	lock = Lock()
+
+	# Window the event is about, by event type.
+	EVENT_WINDOW = {
+		X.SelectionRequest: 'owner',
+		X.SelectionNotify: 'requestor',
+		X.SelectionClear: 'window',
+		X.PropertyNotify: 'window',
+	}
+
+	@classmethod
+	def open(cls, name=None):
+		if name is None:
+			name = os.environ.get('DISPLAY')
+		with cls.lock:
+			connection = cls.connections.get(name)
+			if connection is None or connection.broken:
+				connection = cls(name)
+				cls.connections[name] = connection
+			connection.users += 1
+			return connection
+
+	def __init__(self, name):
+		super().__init__(name='klembord X connection', daemon=True)
+		self.display_name = name
+		self.users = 0
+		self.broken = False
 		self._break = False
-		self.inbox = Queue()
-		self.initX()
+		self.outbox = Queue()
+		# Window id -> XGetter or XSetter
+		self.handlers = {}
+		# Atom cache, name -> atom and atom -> name.
+		self.atoms = {}
+		self.names = {}
+		# Selection atom -> number of ownership changes XFixes reported.
+		self.selectionChanges = {}
+		# Selection atom -> queues of XWatchers interested in those changes.
+		self.watchers = {}
+		self.display = display.Display(name)
+		self.xfixes = self.display.has_extension('XFIXES')
+		if self.xfixes:
+			self.display.xfixes_query_version()
+		self.reactor = XReactor(self.display)
 		self.start()
 
-	def initX(self):
-		self.display = display.Display()
+	def close(self):
+		with self.lock:
+			self.users -= 1
+			if self.users > 0:
+				return
+			for key, connection in list(self.connections.items()):
+				if connection is self:
+					del self.connections[key]
+		self.stop()
 
-		# ATOMS
-		self.SELECTION = self.display.intern_atom(self.selection)
+	def stop(self):
+		self._break = True
+		self.reactor.wakeup()
 
-		self.window = self.display.screen().root.create_window(
-			0, 0, 1, 1, 0, X.CopyFromParent
+	def register(self, window, handler):
+		self.handlers[window.id] = handler
+
+	def unregister(self, window):
+		self.handlers.pop(window.id, None)
+
+	def internAtoms(self, names):
+		# Requests for all uncached names are sent before the first reply is
+		# read, so any number of new atoms costs a single round trip.
+		missing = [name for name in dict.fromkeys(names) if name not in self.atoms]
+		if missing:
+			requests = [
+				request.InternAtom(
+					display=self.display.display,
+					defer=True,
+					name=name,
+					only_if_exists=False,
+				) for name in missing
+			]
+			try:
+				for name, reply in zip(missing, requests):
+					reply.reply()
+					self.atoms[name] = reply.atom
+					self.names[reply.atom] = name
+			finally:
+				self.reactor.wakeup()
+		return [self.atoms[name] for name in names]
+
+	def internAtom(self, name):
+		return self.internAtoms((name, ))[0]
+
+	def atomNames(self, atoms):
+		# Same as internAtoms, but the other way round. Unknown atoms are
+		# None.
+		missing = [
+			atom for atom in dict.fromkeys(atoms)
+			if atom not in self.names and atom != X.NONE
+		]
+		if missing:
+			requests = [
+				request.GetAtomName(
+					display=self.display.display,
+					defer=True,
+					atom=atom,
+				) for atom in missing
+			]
+			try:
+				for atom, reply in zip(missing, requests):
+					try:
+						reply.reply()
+					except BadAtom as e:
+						ErrorReporter.print(e)
+						continue
+					self.names[atom] = reply.name
+					self.atoms[reply.name] = atom
+			finally:
+				self.reactor.wakeup()
+		return [self.names.get(atom) for atom in atoms]
+
+	def trackSelection(self, selection):
+		if not self.xfixes or selection in self.selectionChanges:
+			return
+		self.selectionChanges[selection] = 0
+		self.display.xfixes_select_selection_input(
+			self.display.screen().root,
+			selection,
+			xfixes.XFixesSetSelectionOwnerNotifyMask
+			| xfixes.XFixesSelectionWindowDestroyNotifyMask
+			| xfixes.XFixesSelectionClientCloseNotifyMask,
 		)
-		self.window.set_wm_name('klembord XGetter window')
+		self.reactor.flush()
 
-	def killX(self):
-		self.window.destroy()
-		self.display.close()
+	def addWatcher(self, selection, events):
+		self.trackSelection(selection)
+		self.watchers.setdefault(selection, []).append(events)
 
-	def processEvent(self, xevent):
+	def removeWatcher(self, selection, events):
 		try:
-			target = self.display.get_atom_name(xevent.target)
-		except BadAtom as e:
+			self.watchers.get(selection, []).remove(events)
+		except ValueError:
+			pass
+
+	def selectionOwner(self, selection):
+		# Runs on the event thread. Every XFixes event sent before the owner
+		# reply is queued by the time we have the reply, handling them first
+		# makes the change count match the owner we return.
+		owner = self.display.get_selection_owner(selection)
+		for xevent in self.reactor.events():
+			self.dispatch(xevent)
+		return owner, self.selectionChanges.get(selection)
+
+	def run(self):
+		try:
+			while not self._break:
+				self.processCommands()
+				for xevent in self.reactor.events():
+					self.dispatch(xevent)
+				self.reactor.wait(self.expireTransfers())
+		except Exception as e:
 			ErrorReporter.print(e)
+			self.lost()
 			return
-		if target == 'TARGETS':
+		self.dropCommands()
+		self.shutdown()
+
+	def lost(self):
+		self.broken = True
+		self.dropCommands()
+		for handler in list(self.handlers.values()):
+			handler.connectionLost()
+		for watchers in self.watchers.values():
+			for events in watchers:
+				events.put_nowait(None)
+		self.shutdown()
+
+	def shutdown(self):
+		try:
+			self.display.close()
+		except Exception as e:
+			ErrorReporter.print(e)
+		self.reactor.close()
+
+	def dispatch(self, xevent):
+		if isinstance(xevent, xfixes.SelectionNotify):
+			if xevent.selection in self.selectionChanges:
+				self.selectionChanges[xevent.selection] += 1
+			for events in list(self.watchers.get(xevent.selection, ())):
+				events.put_nowait(xevent)
+			return
+		attribute = self.EVENT_WINDOW.get(xevent.type)
+		if attribute is None:
+			return
+		window = getattr(xevent, attribute)
+		handler = self.handlers.get(window.id)
+		try:
+			if handler is None:
+				if xevent.type == X.PropertyNotify:
+					for handler in self.uniqueHandlers():
+						handler.processEvent(xevent)
+				return
+			handler.processEvent(xevent)
+			if (
+				xevent.type == X.PropertyNotify
+				and xevent.state == X.PropertyDelete
+			):
+				# One of our windows reading what another handler of ours
+				# sends with INCR, say a getter reading from a setter.
+				key = (window.id, xevent.atom)
+				for other in self.uniqueHandlers():
+					if (
+						other is not handler
+						and key in getattr(other, 'transfers', ())
+					):
+						other.processEvent(xevent)
+		except XError as e:
+			# Usually a requestor window that went away, that's no reason
+			# to give up on the connection.
+			ErrorReporter.print(e)
+
+	def uniqueHandlers(self):
+		# Getters register every window they own.
+		return list({
+			id(handler): handler for handler in self.handlers.values()
+		}.values())
+
+	def expireTransfers(self):
+		timeouts = [
+			timeout for timeout in (
+				handler.expireTransfers()
+				for handler in self.uniqueHandlers()
+			) if timeout is not None
+		]
+		return min(timeouts) if timeouts else None
+
+	def processCommands(self):
+		while not self._break:
+			try:
+				command, args, reply = self.outbox.get_nowait()
+				self.outbox.task_done()
+			except Empty:
+				return
 			try:
-				target_atoms = self.window.get_full_property(
-					xevent.target, Xatom.ATOM
-				).value
+				reply.set_result(command(*args))
 			except Exception as e:
 				ErrorReporter.print(e)
-				return
-			data = []
-			for atom in target_atoms:
-				try:
-					data.append(self.display.get_atom_name(atom))
-				except BadAtom as e:
-					ErrorReporter.print(e)
-			data = tuple(data)
+				if not isinstance(e, BrokenConnection):
+					e = BrokenConnection('Command failed: {}'.format(e))
+				reply.set_exception(e)
+
+	def dropCommands(self):
+		while True:
+			try:
+				_, _, reply = self.outbox.get_nowait()
+				self.outbox.task_done()
+			except Empty:
+				break
+			reply.set_exception(BrokenConnection('Connection closed'))
+
+	def call(self, command, *args, timeout=None):
+		if self.broken or self._break:
+			raise BrokenConnection('Connection closed')
+		reply = Future()
+		self.outbox.put_nowait((command, args, reply))
+		self.reactor.wakeup()
+		try:
+			return reply.result(timeout)
+		except FutureTimeout as e:
+			# The thread is busy, not gone: the command still runs once it
+			# gets to it, so this isn't a reason to reconnect.
+			raise TimeoutError('Event thread did not respond in time') from e
+
+	def post(self, command, *args):
+		# Like call() without waiting for the result, failures are only
+		# reported.
+		if self.broken or self._break:
+			raise BrokenConnection('Connection closed')
+		self.outbox.put_nowait((command, args, Future()))
+		self.reactor.wakeup()
+
+
+class IncrTransfer(object):
+
+	def __init__(self, window, target, reply, timeout, limit):
+		self.window = window
+		self.target = target
+		self.reply = reply
+		self.limit = limit
+		self.data = bytearray()
+		self.deadline = time.monotonic() + timeout
+
+
+class XGetter(object):
+	# Every fetch borrows a requestor window of its own from a pool, replies
+	# are routed by window and target, so any number of threads can get()
+	# at once without locking. Windows of fetches that gave up on a target
+	# are destroyed instead of returned to the pool, late replies then have
+	# nowhere to land.
+	#
+	# Overall deadline in seconds for all targets of a single get(),
+	# get() returns as soon as every target is answered.
+	timeout = 1.0
+	# INCR transfers are abandoned if the owner doesn't send the next chunk
+	# within incr_timeout seconds or the data grows past max_size bytes, or
+	# past the limit a fetch set for that target.
+	incr_timeout = 1.0
+	max_size = 256 * 1024 * 1024
+
+	def __init__(self, selection='CLIPBOARD', timeout=None):
+		self.selection = selection
+		if timeout is not None:
+			self.timeout = timeout
+		self.broken = False
+		# Window id -> requestor window, for every window we created.
+		self.requestors = {}
+		# Requestor windows not used by any fetch.
+		self.windows = []
+		# (window id, target atom) -> (target name, Future) for requests in
+		# flight.
+		self.pending = {}
+		# (window id, property atom) -> IncrTransfer for replies arriving in
+		# chunks.
+		self.transfers = {}
+		# Window id -> [(target name, target atom, Future)] of a MULTIPLE in
+		# flight.
+		self.multiple = {}
+		# Window id -> {target name: max bytes} of a fetch with size limits.
+		self.limits = {}
+		# Properties replies are converted into, the n-th target of a fetch
+		# uses the n-th one. Every property is deleted as it's read, so
+		# nothing we fetched stays behind in the X server.
+		self.properties = []
+		# Ownership key (see owner()) and the TARGETS advertised last time we
+		# asked. Used by negotiation and to pick MULTIPLE for owners known
+		# to support it.
+		self.ownerTargets = (None, ())
+		self.connection = self.openConnection()
+		try:
+			self.initX()
+		except Exception:
+			self.connection.close()
+			raise
+
+	def openConnection(self):
+		return XConnection.open()
+
+	def initX(self):
+		self.display = self.connection.display
+		self.reactor = self.connection.reactor
+
+		# ATOMS
+		(
+			self.SELECTION,
+			self.INCR,
+			self.MULTIPLE,
+			self.ATOM_PAIR,
+			self.MULTIPLE_PROPERTY,
+			self.STREAM_PROPERTY,
+		) = self.connection.internAtoms((
+			self.selection,
+			'INCR',
+			'MULTIPLE',
+			'ATOM_PAIR',
+			'KLEMBORD_MULTIPLE',
+			'KLEMBORD_STREAM',
+		))
+
+		self.windows.append(self.createWindow())
+		self.connection.trackSelection(self.SELECTION)
+
+	def killX(self):
+		windows = list(self.requestors.values())
+		for window in windows:
+			self.connection.unregister(window)
+		self.requestors.clear()
+		self.windows = []
+		self.dropReplies()
+		try:
+			for window in windows:
+				window.destroy()
+			self.reactor.flush()
+		except Exception as e:
+			ErrorReporter.print(e)
+		self.connection.close()
+
+	def createWindow(self):
+		window = self.display.screen().root.create_window(
+			0, 0, 1, 1, 0, X.CopyFromParent,
+			event_mask=X.PropertyChangeMask,
+		)
+		window.set_wm_name('klembord XGetter window')
+		self.requestors[window.id] = window
+		self.connection.register(window, self)
+		return window
+
+	def transferProperties(self, count):
+		if len(self.properties) < count:
+			self.properties = self.connection.internAtoms([
+				'KLEMBORD_TRANSFER_{}'.format(i) for i in range(count)
+			])
+		return self.properties[:count]
+
+	def acquireWindow(self):
+		try:
+			return self.windows.pop()
+		except IndexError:
+			return self.createWindow()
+
+	def releaseWindow(self, window, clean):
+		self.limits.pop(window.id, None)
+		if clean:
+			self.windows.append(window)
+			return
+		self.connection.unregister(window)
+		self.requestors.pop(window.id, None)
+		self.multiple.pop(window.id, None)
+		for key in list(self.transfers):
+			if key[0] == window.id:
+				self.transfers.pop(key, None)
+		window.destroy(onerror=errHandler)
+		self.reactor.flush()
+
+	def dropReplies(self):
+		for _, reply in list(self.pending.values()):
+			if not reply.done():
+				reply.set_result(None)
+		self.pending.clear()
+		for batch in list(self.multiple.values()):
+			for _, _, reply in batch:
+				if not reply.done():
+					reply.set_result(None)
+		self.multiple.clear()
+		for transfer in list(self.transfers.values()):
+			if not transfer.reply.done():
+				transfer.reply.set_result(None)
+		self.transfers.clear()
+
+	def connectionLost(self):
+		self.broken = True
+		self.dropReplies()
+
+	def processEvent(self, xevent):
+		if (
+			xevent.type == X.SelectionNotify
+			and xevent.selection == self.SELECTION
+		):
+			self.processReply(xevent)
+		elif (
+			xevent.type == X.PropertyNotify
+			and xevent.state == X.PropertyNewValue
+			and xevent.window.id in self.requestors
+		):
+			self.processChunk(xevent)
+
+	def processReply(self, xevent):
+		window = self.requestors.get(xevent.requestor.id)
+		if window is None:
+			return
+		if xevent.target == self.MULTIPLE and window.id in self.multiple:
+			self.processMultiple(window, xevent)
+			return
+		try:
+			target, reply = self.pending.pop((window.id, xevent.target))
+		except KeyError:
+			return
+		self.readReply(window, target, xevent.property, reply)
+
+	def sizeLimit(self, window, target):
+		limit = self.limits.get(window.id, {}).get(target)
+		if limit is None or limit > self.max_size:
+			return self.max_size
+		return limit
+
+	def processMultiple(self, window, xevent):
+		batch = self.multiple.pop(window.id)
+		if xevent.property == X.NONE:
+			# Owner advertised MULTIPLE but refused it, ask one by one.
+			self.ownerTargets = (None, ())
+			window.delete_property(self.MULTIPLE_PROPERTY, onerror=errHandler)
+			self.requestTargets(window, batch)
+			return
+		try:
+			prop = window.get_property(
+				xevent.property, X.AnyPropertyType, 0, PROPERTY_LENGTH, True
+			)
+		except Exception as e:
+			ErrorReporter.print(e)
+			prop = None
+		# Owner replaces the property of every pair it failed to convert
+		# with None.
+		properties = prop.value[1::2] if prop else ()
+		for i, (target, target_atom, reply) in enumerate(batch):
+			if i < len(properties):
+				self.readReply(window, target, properties[i], reply)
+			else:
+				reply.set_result(None)
+
+	def readReply(self, window, target, property, reply):
+		if property == X.NONE:
+			reply.set_result(None)
+		elif target == 'TARGETS':
+			reply.set_result(self.readTargets(window, property))
 		else:
+			limit = self.sizeLimit(window, target)
 			try:
-				prop = self.window.get_full_property(
-					xevent.target, xevent.target
+				# Reading one unit past the limit tells whether there's more.
+				prop = window.get_property(
+					property,
+					X.AnyPropertyType,
+					0,
+					min(limit // 4 + 1, PROPERTY_LENGTH),
+					True,
 				)
 			except Exception as e:
 				ErrorReporter.print(e)
+				reply.set_result(None)
 				return
-			if prop:
+			if prop is None:
+				reply.set_result(None)
+			elif prop.property_type == self.INCR:
+				self.startTransfer(window, target, reply, property, prop, limit)
+			elif prop.bytes_after:
+				# Only a read reaching the end deletes the property.
+				window.delete_property(property, onerror=errHandler)
+				self.reactor.flush()
+				reply.set_result(None)
+			else:
 				data = prop.value
 				if isinstance(data, str):
 					data = data.encode()
-				else:
-					data = bytes(data)
-			else:
-				data = None
-		self.inbox.put_nowait((target, data))
-
-	def run(self):
-		while True:
-			if self._break:
-				self.killX()
-				break
-			if self.display.pending_events():
-				xevent = self.display.next_event()
-				if (
-					xevent.type == X.SelectionNotify
-					and xevent.selection == self.SELECTION
-					and xevent.requestor == self.window
-				):
-					self.processEvent(xevent)
-			time.sleep(0.005)
+				data = bytes(data)
+				reply.set_result(data if len(data) <= limit else None)
 
-	def get(self, targets):
-		content = {}
+	def readTargets(self, window, property):
 		try:
-			self.display.flush()
+			target_atoms = window.get_property(
+				property, Xatom.ATOM, 0, PROPERTY_LENGTH, True
+			).value
 		except Exception as e:
 			ErrorReporter.print(e)
-			raise BrokenConnection('Flushing events failed') from e
+			return None
+		return tuple(
+			name for name in self.connection.atomNames(target_atoms) if name
+		)
+
+	def startTransfer(self, window, target, reply, property, prop, limit):
+		# The INCR property holds a lower bound of the total size.
+		if len(prop.value) and prop.value[0] > limit:
+			reply.set_result(None)
+			return
+		reply.set_running_or_notify_cancel()
+		self.transfers[(window.id, property)] = IncrTransfer(
+			window, target, reply, self.incr_timeout, limit
+		)
+		# readReply() deleted the INCR property, that asks the owner for the
+		# first chunk.
+		self.reactor.flush()
+
+	def processChunk(self, xevent):
+		key = (xevent.window.id, xevent.atom)
+		transfer = self.transfers.get(key)
+		if transfer is None:
+			return
 		try:
-			owner = self.display.get_selection_owner(self.SELECTION)
-		except BadAtom as e:
+			prop = transfer.window.get_property(
+				xevent.atom, X.AnyPropertyType, 0, PROPERTY_LENGTH, True
+			)
+			self.reactor.flush()
+		except Exception as e:
 			ErrorReporter.print(e)
-			raise BrokenConnection('Bad selection atom') from e
+			self.finishTransfer(key, None)
+			return
+		if prop is None:
+			return
+		if not len(prop.value):
+			self.finishTransfer(key, bytes(transfer.data))
+		elif len(transfer.data) + len(prop.value) > transfer.limit:
+			self.finishTransfer(key, None)
+		else:
+			transfer.data += prop.value
+			transfer.deadline = time.monotonic() + self.incr_timeout
+
+	def finishTransfer(self, key, data):
+		transfer = self.transfers.pop(key, None)
+		if transfer is not None:
+			transfer.reply.set_result(data)
+
+	def expireTransfers(self):
+		if not self.transfers:
+			return None
+		now = time.monotonic()
+		for key, transfer in list(self.transfers.items()):
+			if transfer.deadline <= now:
+				self.finishTransfer(key, None)
+				if instrument.hook is not None:
+					instrument.hook.count('incr.expired')
+		transfers = list(self.transfers.values())
+		if transfers:
+			return min(t.deadline for t in transfers) - now
+		return None
+
+	def get(self, targets, timeout=None, negotiate=False):
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		content = dict.fromkeys(targets)
+		owner, key = self.owner()
 		if owner != X.NONE:
+			if negotiate:
+				offered = self.offered(owner, key, timeout)
+				targets = [
+					target for target in targets
+					if target == 'TARGETS' or target in offered
+				]
+			if targets:
+				content.update(self.fetch(owner, key, targets, timeout))
+		return content
+
+	def getPreferred(self, targets, timeout=None):
+		# Fetch only the first of targets the owner offers and can convert.
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		owner, key = self.owner()
+		if owner != X.NONE:
+			offered = self.offered(owner, key, timeout)
 			for target in targets:
-				target_atom = self.display.intern_atom(target)
-				selection_request = event.SelectionRequest(
-					owner=owner,
-					requestor=self.window,
-					selection=self.SELECTION,
-					target=target_atom,
-					property=target_atom,
-					time=X.CurrentTime,
+				if target in offered:
+					data = self.fetch(owner, key, (target, ), timeout)[target]
+					if data is not None:
+						return target, data
+		return None, None
+
+	def owner(self):
+		# Returns the owner and a key that identifies its current ownership
+		# while XFixes is around, (owner id, None) otherwise.
+		try:
+			if self.connection.xfixes:
+				owner, changes = self.connection.call(
+					self.connection.selectionOwner,
+					self.SELECTION,
+					timeout=self.timeout,
 				)
-				owner.send_event(selection_request, onerror=errHandler)
-				try:
-					self.display.flush()
-				except Exception as e:
-					ErrorReporter.print(e)
-					raise BrokenConnection('Flushing events failed') from e
-				if errHandler.get_error():
-					raise BrokenConnection('Sending event failed')
-			now = time.monotonic()
-			while self.inbox.empty():
-				if (time.monotonic() - now) >= 0.05:
-					break
-				time.sleep(0.005)
-			now = time.monotonic()
-			while not self.inbox.empty():
-				if (time.monotonic() - now) >= 0.05:
-					break
-				try:
-					target, data = self.inbox.get_nowait()
-					self.inbox.task_done()
-				except Empty:
-					break
-				content[target] = data
-		for target in targets:
-			if target not in content:
+			else:
+				self.reactor.flush()
+				owner = self.display.get_selection_owner(self.SELECTION)
+				changes = None
+		except (BrokenConnection, TimeoutError):
+			raise
+		except Exception as e:
+			ErrorReporter.print(e)
+			raise BrokenConnection('Getting selection owner failed') from e
+		finally:
+			self.reactor.wakeup()
+		if owner == X.NONE:
+			return X.NONE, None
+		return owner, (owner.id, changes)
+
+	def offered(self, owner, key, timeout):
+		cached_key, cached = self.ownerTargets
+		# Without XFixes we can't tell whether the owner changed its content
+		# since, so the cache is only trusted with it.
+		if key[1] is not None and cached_key == key:
+			return cached
+		return self.fetch(owner, key, ('TARGETS', ), timeout)['TARGETS'] or ()
+
+	def snapshot(self, max_bytes=None, limits=None, timeout=None):
+		# Everything the owner offers but meta targets, see requested_sizes().
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		owner, key = self.owner()
+		if owner == X.NONE:
+			return {}
+		offered = self.offered(owner, key, timeout)
+		sizes = requested_sizes(offered, max_bytes, limits)
+		if not sizes:
+			return {}
+		content = self.fetch(owner, key, tuple(sizes), timeout, sizes)
+		return kept_content(content, sizes)
+
+	def fetch(self, owner, key, targets, timeout, limits=None):
+		started = time.perf_counter()
+		window, replies = self.request(key, targets, limits)
+		wait([reply for _, reply in replies.values()], timeout=timeout)
+		# INCR transfers that already started are bound by incr_timeout
+		# per chunk instead of the overall deadline.
+		wait([reply for _, reply in replies.values() if reply.running()])
+		return self.collect(key, window, replies, started)
+
+	def request(self, key, targets, limits=None):
+		# Sends conversions for targets from a window of their own, returns
+		# the window and target -> (target atom, Future). limits maps
+		# targets to the most bytes to accept, larger replies are None.
+		replies = {}
+		batch = []
+		target_atoms = self.connection.internAtoms(targets)
+		for target, target_atom in zip(targets, target_atoms):
+			if target not in replies:
+				replies[target] = (target_atom, Future())
+				batch.append((target, target_atom, replies[target][1]))
+		owner_key, owner_targets = self.ownerTargets
+		try:
+			window = self.acquireWindow()
+			if limits:
+				self.limits[window.id] = limits
+			try:
+				if (
+					len(batch) > 1
+					and owner_key is not None
+					and owner_key[0] == key[0]
+					and 'MULTIPLE' in owner_targets
+				):
+					self.requestMultiple(window, batch)
+				else:
+					self.requestTargets(window, batch)
+			except Exception:
+				self.releaseWindow(window, False)
+				raise
+		except BrokenConnection:
+			raise
+		except Exception as e:
+			ErrorReporter.print(e)
+			raise BrokenConnection('Converting selection failed') from e
+		return window, replies
+
+	def collect(self, key, window, replies, started):
+		# Reads the replies that came in and forgets about the rest.
+		content = {}
+		clean = True
+		for target, (target_atom, reply) in replies.items():
+			if reply.done():
+				content[target] = reply.result()
+			else:
 				content[target] = None
+				clean = False
+				self.pending.pop((window.id, target_atom), None)
+		self.releaseWindow(window, clean)
+		hook = instrument.hook
+		if hook is not None:
+			hook.observe('owner.response', time.perf_counter() - started)
+			hook.count('get.targets', len(replies))
+			hook.count('get.unanswered', sum(
+				1 for _, reply in replies.values() if not reply.done()
+			))
+			hook.count('bytes.received', sum(
+				len(data) for target, data in content.items()
+				if data is not None and target != 'TARGETS'
+			))
+		if content.get('TARGETS'):
+			self.ownerTargets = (key, content['TARGETS'])
 		return content
 
+	def requestTargets(self, window, batch):
+		# All conversions are sent before flushing, so the owner gets them
+		# in one go and the replies stream back together. Each target is
+		# converted into the property of the same name.
+		onerror = CatchError()
+		properties = self.transferProperties(len(batch))
+		for (target, target_atom, reply), property in zip(batch, properties):
+			# Register before sending, the reply may arrive right away.
+			self.pending[(window.id, target_atom)] = (target, reply)
+			window.convert_selection(
+				self.SELECTION,
+				target_atom,
+				property,
+				X.CurrentTime,
+				onerror=onerror,
+			)
+		self.reactor.flush()
+		if onerror.get_error():
+			raise BrokenConnection('Converting selection failed')
+
+	def requestMultiple(self, window, batch):
+		onerror = CatchError()
+		pairs = []
+		properties = self.transferProperties(len(batch))
+		for (_, target_atom, _), property in zip(batch, properties):
+			pairs += [target_atom, property]
+		self.multiple[window.id] = batch
+		window.change_property(
+			self.MULTIPLE_PROPERTY,
+			self.ATOM_PAIR,
+			32,
+			pairs,
+			onerror=onerror,
+		)
+		window.convert_selection(
+			self.SELECTION,
+			self.MULTIPLE,
+			self.MULTIPLE_PROPERTY,
+			X.CurrentTime,
+			onerror=onerror,
+		)
+		self.reactor.flush()
+		if onerror.get_error():
+			self.multiple.pop(window.id, None)
+			raise BrokenConnection('Converting selection failed')
+
+	def open(self, target, timeout=None):
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		try:
+			reader = XReader(self, target, timeout)
+		except BrokenConnection:
+			raise
+		except Exception as e:
+			ErrorReporter.print(e)
+			raise BrokenConnection('Converting selection failed') from e
+		if reader.property is None:
+			reader.close()
+			return None
+		return io.BufferedReader(reader)
+
 	def exit(self):
-		self._break = True
-		# self.join()
-		time.sleep(0.005)
+		self.killX()
+
+
+class XReader(io.RawIOBase):
+	# Streams a single target into a requestor window of its own. Data is
+	# only read from the X server as the consumer asks for it: slices of the
+	# property for plain replies, one chunk at a time for INCR, where
+	# deleting the property is what makes the owner send the next chunk. So
+	# no more than a chunk is held at once, however large the content.
+	# Events arrive on the connection thread, X I/O happens on the reader's.
+	chunk_size = 1024 * 1024
+
+	def __init__(self, getter, target, timeout):
+		super().__init__()
+		self.connection = getter.connection
+		self.reactor = getter.reactor
+		self.incr_timeout = getter.incr_timeout
+		self.events = Queue()
+		# Property the reply is in, None once there's nothing left to read.
+		self.property = None
+		self.incr = False
+		self.size = 0
+		self.offset = 0
+		self.chunk = memoryview(b'')
+		self.window = None
+		self.TARGET = self.connection.internAtom(target)
+		self.PROPERTY = getter.STREAM_PROPERTY
+		self.window = getter.display.screen().root.create_window(
+			0, 0, 1, 1, 0, X.CopyFromParent,
+			event_mask=X.PropertyChangeMask,
+		)
+		self.window.set_wm_name('klembord XReader window')
+		self.connection.register(self.window, self)
+		try:
+			self.request(getter.SELECTION, getter.INCR, timeout)
+		except Exception:
+			self.close()
+			raise
+
+	def request(self, selection, incr, timeout):
+		onerror = CatchError()
+		self.window.convert_selection(
+			selection, self.TARGET, self.PROPERTY, X.CurrentTime,
+			onerror=onerror,
+		)
+		self.reactor.flush()
+		if onerror.get_error():
+			raise BrokenConnection('Converting selection failed')
+		deadline = time.monotonic() + timeout
+		while True:
+			try:
+				xevent = self.events.get(
+					timeout=max(deadline - time.monotonic(), 0)
+				)
+			except Empty:
+				return
+			if xevent is None:
+				raise BrokenConnection('X connection lost')
+			# PropertyNotify of the owner writing the reply comes first.
+			if xevent.type == X.SelectionNotify:
+				break
+		if xevent.property == X.NONE:
+			return
+		# Zero length read, just the type and size.
+		prop = self.window.get_property(
+			xevent.property, X.AnyPropertyType, 0, 0
+		)
+		self.reactor.wakeup()
+		if prop is None:
+			return
+		self.property = xevent.property
+		if prop.property_type == incr:
+			# Deleting it asks for the first chunk.
+			self.incr = True
+			self.window.delete_property(self.property, onerror=errHandler)
+			self.reactor.flush()
+		else:
+			self.size = prop.bytes_after
+
+	def processEvent(self, xevent):
+		if (
+			xevent.type == X.SelectionNotify
+			and xevent.target == self.TARGET
+		) or (
+			# PropertyNotify on foreign windows reaches every handler, say
+			# while our setter sends INCR to another process's reader.
+			xevent.type == X.PropertyNotify
+			and xevent.state == X.PropertyNewValue
+			and xevent.window.id == self.window.id
+			and xevent.atom == self.PROPERTY
+		):
+			self.events.put_nowait(xevent)
+
+	def expireTransfers(self):
+		return None
+
+	def connectionLost(self):
+		self.events.put_nowait(None)
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+		if not len(self.chunk):
+			if self.incr:
+				self.chunk = self.nextChunk()
+			else:
+				self.chunk = self.nextSlice()
+		buffer = memoryview(buffer).cast('B')
+		length = min(len(buffer), len(self.chunk))
+		buffer[:length] = self.chunk[:length]
+		self.chunk = self.chunk[length:]
+		return length
+
+	def nextSlice(self):
+		if self.property is None or self.offset >= self.size:
+			return memoryview(b'')
+		# Offsets and lengths are in 32-bit units, chunk_size is a multiple.
+		# The property is deleted with the read that reaches its end.
+		prop = self.window.get_property(
+			self.property,
+			X.AnyPropertyType,
+			self.offset // 4,
+			self.chunk_size // 4,
+			True,
+		)
+		self.reactor.wakeup()
+		data = self.propertyBytes(prop)
+		self.offset += len(data)
+		if not len(data):
+			self.property = None
+		return memoryview(data)
+
+	def nextChunk(self):
+		if self.property is None:
+			return memoryview(b'')
+		while True:
+			try:
+				xevent = self.events.get(timeout=self.incr_timeout)
+			except Empty:
+				raise TimeoutError('Selection owner stopped sending data')
+			if xevent is None:
+				raise BrokenConnection('X connection lost')
+			if xevent.type == X.PropertyNotify:
+				break
+		prop = self.window.get_property(
+			self.property, X.AnyPropertyType, 0, PROPERTY_LENGTH, True
+		)
+		self.reactor.flush()
+		data = self.propertyBytes(prop)
+		# The last, zero length chunk marks the end of the transfer.
+		if not len(data):
+			self.property = None
+		return memoryview(data)
 
+	@staticmethod
+	def propertyBytes(prop):
+		if prop is None:
+			return b''
+		data = prop.value
+		if isinstance(data, str):
+			return data.encode()
+		elif isinstance(data, bytes):
+			return data
+		return data.tobytes()
+
+	def close(self):
+		if not self.closed and self.window is not None:
+			self.connection.unregister(self.window)
+			try:
+				self.window.destroy()
+				self.reactor.flush()
+			except Exception as e:
+				ErrorReporter.print(e)
+		super().close()
 
-class XSetter(Thread):
 
-	def __init__(self, selection='CLIPBOARD', reset=None):
-		super().__init__(name='klembord XSetter', daemon=True)
+class LazyContent(object):
+	# Wraps a provider set() was given instead of data. It's called the first
+	# time the target is requested, on a thread resolveLater() starts or by a
+	# local get(), and the result is kept for the rest of the ownership.
+
+	def __init__(self, provider):
+		self.provider = provider
+		self.lock = Lock()
+		self.resolved = False
+		self.data = None
+		# Callbacks waiting for the resolver thread, None while none runs.
+		self.waiting = None
+		self.waitingLock = Lock()
+
+	def resolve(self):
+		if not self.resolved:
+			with self.lock:
+				if not self.resolved:
+					try:
+						data = self.provider()
+						if callable(data):
+							raise TypeError('Provider returned a provider')
+						data = XSetter.openSource(data)
+					except Exception as e:
+						ErrorReporter.print(e)
+						data = None
+					self.data = data
+					self.resolved = True
+					self.provider = None
+		return self.data
+
+	def resolveLater(self, callback):
+		# Calls callback once resolved. However many requests wait for the
+		# provider, there's a single thread calling it.
+		with self.waitingLock:
+			if self.waiting is not None:
+				self.waiting.append(callback)
+				return
+			self.waiting = [callback]
+		Thread(
+			target=self.resolveWaiting,
+			name='klembord provider',
+			daemon=True,
+		).start()
+
+	def resolveWaiting(self):
+		self.resolve()
+		with self.waitingLock:
+			callbacks, self.waiting = self.waiting, None
+		for callback in callbacks:
+			callback()
+
+
+class IncrSender(object):
+
+	def __init__(self, requestor, property, target, data, timeout):
+		self.requestor = requestor
+		self.property = property
+		self.target = target
+		self.data = memoryview(data).cast('B')
+		self.offset = 0
+		self.deadline = time.monotonic() + timeout
+		# Errors of this transfer's requests only.
+		self.onerror = CatchError()
+
+
+class XSetter(object):
+	# All X I/O of the setter happens on the shared XConnection thread.
+	# set(), clear() and store() hand their work over to it as commands and
+	# wait for the result, requests and INCR transfers are served in
+	# between. Winning or losing ownership only swaps self.content, so every
+	# request is answered from the content that was current when it arrived.
+	#
+	# Payloads larger than incr_threshold bytes are sent with INCR in chunks
+	# of that size. None, or anything above what fits in a single request,
+	# means the largest property one ChangeProperty request can carry.
+	# Requestors that stall for incr_timeout seconds are dropped.
+	# Commands not finished within timeout seconds raise TimeoutError.
+	#
+	# Providers given instead of data are called on a thread of their own,
+	# one per provider however many requests wait for it. Requests needing
+	# them are answered once they return, so a slow one doesn't hold up
+	# anything else on the connection.
+	#
+	# With coalesce set to a number of seconds, set() returns without
+	# waiting and the event thread only applies the newest content handed
+	# over since it last looked. While we own the selection that content
+	# just replaces the reply table, so requestors are always answered with
+	# the latest, and ownership is taken again at most once per coalesce
+	# seconds to let clipboard managers and watchers know it changed.
+	incr_threshold = None
+	incr_timeout = 5.0
+	timeout = 1.0
+	coalesce = None
+
+	def __init__(self, selection='CLIPBOARD', reset=None, coalesce=None):
 		self.selection = selection
 		self.reset = reset
-		self._break = False
+		if coalesce is not None:
+			self.coalesce = coalesce
 		self.save_targets = []
-		self.outbox = Queue()
-		self.requests = Queue()
-		self.content_set = False
-		self.initX()
-		self.eventLoop = Thread(
-			target=self.processEvents,
-			name='klembord XSetter event loop',
-			daemon=True,
-		)
-		self.start()
-		self.eventLoop.start()
+		# Target atom -> (type, format, value) reply while we own the
+		# selection, None otherwise. Built once per ownership by
+		# buildReplies(), LazyContent until first requested.
+		self.content = None
+		# Same content keyed by target name, for the owner-local fast path.
+		self.local = None
+		# contentDigest() of the content we own, see takeOwnership().
+		self.digest = None
+		# Newest (content, digest) set() handed over in coalescing mode, and
+		# when the content replaced since is to be announced.
+		self.latest = None
+		self.latestLock = Lock()
+		self.announceAt = None
+		# (requestor window id, property atom) -> IncrSender
+		self.transfers = {}
+		self.connection = self.openConnection()
+		try:
+			self.initX()
+		except Exception:
+			self.connection.close()
+			raise
+
+	def openConnection(self):
+		return XConnection.open()
 
 	def initX(self):
-		self.display = display.Display()
+		self.display = self.connection.display
 
 		# ATOMS
-		self.SELECTION = self.display.intern_atom(self.selection)
-		self.TARGETS = self.display.intern_atom('TARGETS')
-		self.SAVE_TARGETS = self.display.intern_atom('SAVE_TARGETS')
-		self.CLIPBOARD_MANAGER = self.display.intern_atom('CLIPBOARD_MANAGER')
-		self.ST_PROPERTY = self.display.intern_atom('KLEMBORD_SELECTION')
-		self.MULTIPLE = self.display.intern_atom('MULTIPLE')
+		(
+			self.SELECTION,
+			self.TARGETS,
+			self.SAVE_TARGETS,
+			self.CLIPBOARD_MANAGER,
+			self.ST_PROPERTY,
+			self.MULTIPLE,
+			self.INCR,
+			self.ATOM_PAIR,
+		) = self.connection.internAtoms((
+			self.selection,
+			'TARGETS',
+			'SAVE_TARGETS',
+			'CLIPBOARD_MANAGER',
+			'KLEMBORD_SELECTION',
+			'MULTIPLE',
+			'INCR',
+			'ATOM_PAIR',
+		))
+
+		# ChangeProperty has a 24 byte header.
+		max_size = self.display.display.info.max_request_length * 4 - 24
+		if self.incr_threshold is None or self.incr_threshold > max_size:
+			self.incr_threshold = max_size
 
 		self.window = self.display.screen().root.create_window(
 			0, 0, 1, 1, 0, X.CopyFromParent
 		)
 		self.window.set_wm_name('klembord XSetter')
+		self.connection.register(self.window, self)
 
-		self.selection_clear = event.SelectionClear(
-			window=self.window,
-			atom=self.SELECTION,
-			time=X.CurrentTime,
+	def killX(self):
+		self.connection.unregister(self.window)
+		self.local = None
+		self.content = None
+		self.transfers.clear()
+		try:
+			self.window.destroy()
+			self.connection.reactor.flush()
+		except Exception as e:
+			ErrorReporter.print(e)
+		self.connection.close()
+
+	@property
+	def content_set(self):
+		return self.content is not None
+
+	def connectionLost(self):
+		try:
+			self.reset()
+		except BrokenConnection as e:
+			# The next set() reconnects again.
+			ErrorReporter.print(e)
+
+	def call(self, command, *args):
+		return self.connection.call(command, *args, timeout=self.timeout)
+
+	def processEvent(self, xevent):
+		if (
+			xevent.type == X.SelectionRequest
+			and xevent.owner == self.window
+			and xevent.selection == self.SELECTION
+		):
+			self.serve(xevent)
+		elif (
+			xevent.type == X.SelectionClear
+			and xevent.window == self.window
+			and xevent.atom == self.SELECTION
+		):
+			self.ownershipLost()
+		elif (
+			xevent.type == X.SelectionNotify
+			and xevent.selection == self.CLIPBOARD_MANAGER
+			and xevent.target == self.SAVE_TARGETS
+		):
+			if xevent.property == X.NONE:
+				print(
+					'Failed to transfer ownership to Clipboard Manager',
+					file=sys.stderr
+				)
+		elif (
+			xevent.type == X.PropertyNotify
+			and xevent.state == X.PropertyDelete
+		):
+			self.sendChunk(xevent)
+
+	@spanned('serve')
+	def serve(self, xevent):
+		if self.content is not None:
+			waiting = self.unresolved(xevent)
+			if waiting:
+				self.deferRequest(xevent, waiting)
+				return
+		if self.content is None:
+			client_prop = X.NONE
+			if instrument.hook is not None:
+				instrument.hook.count('serve.refused')
+		else:
+			client_prop = self.processRequest(
+				xevent.requestor,
+				xevent.property,
+				xevent.target,
+			)
+		selection_notify = event.SelectionNotify(
+			time=xevent.time,
+			requestor=xevent.requestor,
+			selection=xevent.selection,
+			target=xevent.target,
+			property=client_prop,
 		)
+		xevent.requestor.send_event(selection_notify, onerror=errHandler)
+		self.display.flush()
 
-	def killX(self):
-		self.window.destroy()
-		self.display.close()
+	def unresolved(self, xevent):
+		# Providers the request needs that haven't been called yet.
+		replies = self.content
+		lazy = [
+			reply for reply in replies.values()
+			if isinstance(reply, LazyContent) and not reply.resolved
+		]
+		if not lazy:
+			return []
+		targets = [xevent.target]
+		if xevent.target == self.MULTIPLE and xevent.property != X.NONE:
+			wanted = xevent.requestor.get_full_property(
+				xevent.property, X.AnyPropertyType
+			)
+			if wanted:
+				targets = wanted.value[0::2]
+		needed = [replies.get(target) for target in targets]
+		return [reply for reply in lazy if reply in needed]
 
-	def run(self):
-		def serve():
-			while True:
-				xevent = self.requests.get()
-				self.requests.task_done()
-				if xevent is None:
-					break
-				elif xevent.type == X.SelectionRequest:
-					client_prop = process_request(
-						xevent.requestor,
-						xevent.property,
-						xevent.target
-					)
-					selection_notify = event.SelectionNotify(
-						time=xevent.time,
-						requestor=xevent.requestor,
-						selection=xevent.selection,
-						target=xevent.target,
-						property=client_prop,
-					)
-					xevent.requestor.send_event(
-						selection_notify, onerror=errHandler
-					)
-					try:
-						self.display.flush()
-					except Exception as e:
-						ErrorReporter.print(e)
-						self.reset()
-						break
-				elif xevent.type == X.SelectionClear:
-					while not self.requests.empty():
-						try:
-							self.requests.get_nowait()
-							self.requests.task_done()
-						except Empty:
-							break
-					self.content_set = False
-					break
-				elif xevent.type == X.SelectionNotify and xevent.property == X.NONE:
-					print(
-						'Failed to transfer ownership to Clipboard Manager',
-						file=sys.stderr
-					)
-					break
+	def deferRequest(self, xevent, waiting):
+		# Served again once the first provider it needs returns, serve()
+		# defers it again if it needs more.
+		def ready():
+			try:
+				self.connection.post(self.serve, xevent)
+			except BrokenConnection:
+				# The requestor gives up on its own.
+				pass
 
-		def process_request(client, property, target):
-			prop_set = True
-			if property == X.NONE:
-				client_prop = target
+		waiting[0].resolveLater(ready)
+
+	def buildReplies(self, content):
+		# Everything requests are answered with, prepared when ownership is
+		# taken: TARGETS packed and payloads encoded, so serving is a lookup
+		# and a single ChangeProperty.
+		replies = {}
+		targets = [self.TARGETS, self.SAVE_TARGETS, self.MULTIPLE]
+		for target, data in content.items():
+			if data:
+				targets.append(target)
+			if isinstance(data, LazyContent):
+				replies[target] = data
 			else:
-				client_prop = property
-			if target == self.TARGETS:
-				prop_value = [self.TARGETS, self.SAVE_TARGETS]
-				prop_value += [t for t, data in content.items() if data]
-				prop_type = Xatom.ATOM
-				prop_format = 32
-			elif target in content:
-				data = content[target]
-				if isinstance(data, str):
-					prop_value = data.encode()
-				elif isinstance(data, ByteString):
-					prop_value = data
-				else:
-					client_prop = X.NONE
-				prop_type = target
-				prop_format = 8
-			elif target == self.MULTIPLE:
-				try:
-					wanted_prop = client.get_full_property(
-						client_prop, X.AnyPropertyType
-					)
-				except Exception as e:
-					ErrorReporter.print(e)
-					self.reset()
-					return
-				if wanted_prop:
-					wanted = [
-						wanted_prop.value[i:i + 2]
-							for i in range(0, len(wanted_prop.value), 2)
+				replies[target] = self.payloadReply(target, data)
+		replies[self.TARGETS] = (
+			Xatom.ATOM,
+			32,
+			struct.pack('={}L'.format(len(targets)), *targets),
+		)
+		return replies
+
+	def payloadReply(self, target, data):
+		if data is None:
+			return None
+		if isinstance(data, str):
+			data = data.encode()
+		elif not isinstance(data, bytes) and len(data) <= self.incr_threshold:
+			# Xlib only sends bytes as they are, larger buffers go with INCR
+			# in slices of their own.
+			data = bytes(data)
+		return (target, 8, data)
+
+	def processRequest(self, client, property, target):
+		replies = self.content
+		prop_set = True
+		if property == X.NONE:
+			client_prop = target
+		else:
+			client_prop = property
+		reply = replies.get(target)
+		if isinstance(reply, LazyContent):
+			reply = replies[target] = self.payloadReply(target, reply.resolve())
+		if reply is not None:
+			prop_type, prop_format, prop_value = reply
+			if prop_format == 8:
+				if len(prop_value) > self.incr_threshold:
+					self.startTransfer(client, client_prop, target, prop_value)
+					prop_value = [len(prop_value)]
+					prop_type = self.INCR
+					prop_format = 32
+				elif instrument.hook is not None:
+					instrument.hook.count('bytes.sent', len(prop_value))
+		elif target == self.MULTIPLE:
+			wanted_prop = client.get_full_property(
+				client_prop, X.AnyPropertyType
+			)
+			if wanted_prop:
+				wanted = [
+					wanted_prop.value[i:i + 2]
+						for i in range(0, len(wanted_prop.value), 2)
+				]
+				converted = []
+				for target, prop in wanted:
+					converted += [
+						target, self.processRequest(client, prop, target)
 					]
-					for target, prop in wanted:
-						process_request(client, prop, target)
-					prop_set = False
+				# Pairs we couldn't convert have their property replaced
+				# with None, as the ICCCM asks.
+				if converted != list(wanted_prop.value):
+					prop_value = converted
+					prop_type = self.ATOM_PAIR
+					prop_format = 32
 				else:
-					client_prop = X.NONE
+					prop_set = False
 			else:
 				client_prop = X.NONE
-			if client_prop != X.NONE and prop_set:
-				client.change_property(
-					client_prop,
-					prop_type,
-					prop_format,
-					prop_value,
-					onerror=errHandler,
-				)
-				try:
-					self.display.flush()
-				except Exception as e:
-					ErrorReporter.print(e)
-					self.reset()
-					return
-				if errHandler.get_error():
-					self.reset()
-					return
-			return client_prop
+		else:
+			client_prop = X.NONE
+		if client_prop != X.NONE and prop_set:
+			onerror = CatchError()
+			client.change_property(
+				client_prop,
+				prop_type,
+				prop_format,
+				prop_value,
+				onerror=onerror,
+			)
+			self.display.flush()
+			if onerror.get_error():
+				return X.NONE
+		return client_prop
 
-		while True:
-			content = self.outbox.get()
-			self.outbox.task_done()
-			if content is None:
-				break
-			self.content_set = True
-			self.window.set_selection_owner(
-				self.SELECTION,
+	def startTransfer(self, requestor, property, target, data):
+		transfer = IncrSender(
+			requestor, property, target, data, self.incr_timeout
+		)
+		self.transfers[(requestor.id, property)] = transfer
+		# Requestor deleting the property is our cue to send the next chunk.
+		# Our own windows select PropertyChangeMask already.
+		if requestor.id not in self.connection.handlers:
+			requestor.change_attributes(
+				event_mask=X.PropertyChangeMask, onerror=transfer.onerror
+			)
+
+	def endTransfer(self, key):
+		# Stops listening to the requestor's properties once its last
+		# transfer is over.
+		transfer = self.transfers.pop(key, None)
+		if transfer is None:
+			return
+		window_id = key[0]
+		if window_id in self.connection.handlers or any(
+			other[0] == window_id for other in self.transfers
+		):
+			return
+		transfer.requestor.change_attributes(
+			event_mask=X.NoEventMask, onerror=errHandler
+		)
+		self.display.flush()
+
+	def sendChunk(self, xevent):
+		key = (xevent.window.id, xevent.atom)
+		transfer = self.transfers.get(key)
+		if transfer is None:
+			return
+		chunk = transfer.data[
+			transfer.offset:transfer.offset + self.incr_threshold
+		]
+		transfer.offset += len(chunk)
+		transfer.deadline = time.monotonic() + self.incr_timeout
+		transfer.requestor.change_property(
+			transfer.property,
+			transfer.target,
+			8,
+			bytes(chunk),
+			onerror=transfer.onerror,
+		)
+		self.display.flush()
+		if transfer.onerror.get_error():
+			self.endTransfer(key)
+			return
+		# The last, zero length chunk marks the end of the transfer.
+		if not len(chunk):
+			self.endTransfer(key)
+		if instrument.hook is not None:
+			instrument.hook.count('bytes.sent', len(chunk))
+
+	def expireTransfers(self):
+		now = time.monotonic()
+		timeouts = []
+		if self.announceAt is not None:
+			if self.announceAt <= now:
+				self.announceAt = None
+				if self.content is not None:
+					self.acquire(self.local, self.digest)
+			else:
+				timeouts.append(self.announceAt - now)
+		for key, transfer in list(self.transfers.items()):
+			if transfer.deadline <= now:
+				self.endTransfer(key)
+				if instrument.hook is not None:
+					instrument.hook.count('incr.expired')
+		timeouts.extend(t.deadline - now for t in self.transfers.values())
+		return min(timeouts) if timeouts else None
+
+	def takeOwnership(self, content, digest=None):
+		if digest is not None:
+			# A SelectionClear may be waiting, owning matters.
+			self.dispatchPending()
+			if self.content is not None and digest == self.digest:
+				# Taking it again would only make clipboard managers fetch
+				# the same content again.
+				return
+		self.acquire(content, digest)
+
+	def applyLatest(self):
+		with self.latestLock:
+			latest, self.latest = self.latest, None
+		if latest is None:
+			return
+		content, digest = latest
+		self.dispatchPending()
+		if self.content is None:
+			self.announceAt = None
+			self.acquire(content, digest)
+		elif digest is None or digest != self.digest:
+			self.replaceContent(content, digest)
+			if self.announceAt is None:
+				self.announceAt = time.monotonic() + self.coalesce
+
+	def dispatchPending(self):
+		for xevent in self.connection.reactor.events():
+			self.connection.dispatch(xevent)
+
+	def prepareContent(self, content):
+		# Returns the reply table and SAVE_TARGETS for content.
+		save_targets = []
+		content_atoms = {}
+		target_atoms = self.connection.internAtoms(content)
+		for target_atom, data in zip(target_atoms, content.values()):
+			if data:
+				save_targets.append(target_atom)
+			content_atoms[target_atom] = data
+		return self.buildReplies(content_atoms), save_targets
+
+	def replaceContent(self, content, digest):
+		# Requests are answered from the new content from now on, without
+		# telling anyone ownership changed.
+		self.content, self.save_targets = self.prepareContent(content)
+		self.local = content
+		self.digest = digest
+
+	def acquire(self, content, digest):
+		replies, save_targets = self.prepareContent(content)
+		onerror = CatchError()
+		self.window.set_selection_owner(
+			self.SELECTION,
+			X.CurrentTime,
+			onerror=onerror
+		)
+		# Errors come in before the reply, checking after it is reliable.
+		owner = self.display.get_selection_owner(self.SELECTION)
+		# Events the server sent before the reply, already read by Xlib.
+		earlier = len(self.display.display.event_queue)
+		if onerror.get_error():
+			raise BrokenConnection('Failed to set selection owner')
+		if owner != self.window:
+			self.local = None
+			self.content = None
+			return
+		self.content = replies
+		self.local = content
+		self.digest = digest
+		self.save_targets = save_targets
+		# The X server only sends SelectionClear to another client, setters
+		# sharing our connection learn they lost the selection here.
+		for handler in self.connection.uniqueHandlers():
+			if (
+				handler is not self
+				and isinstance(handler, XSetter)
+				and handler.SELECTION == self.SELECTION
+			):
+				handler.ownershipLost()
+		# Our SelectionClear events queued before the owner reply are
+		# about an ownership we no longer care about. Those read after it,
+		# pending_events() reads more from the socket, are about this one.
+		for xevent in self.connection.reactor.events():
+			if earlier > 0:
+				earlier -= 1
+				if (
+					xevent.type == X.SelectionClear
+					and xevent.window == self.window
+				):
+					continue
+			self.connection.dispatch(xevent)
+
+	def ownershipLost(self):
+		self.local = None
+		self.content = None
+		self.announceAt = None
+
+	def dropOwnership(self):
+		with self.latestLock:
+			self.latest = None
+		self.announceAt = None
+		self.local = None
+		self.content = None
+		self.save_targets = []
+		onerror = CatchError()
+		request.SetSelectionOwner(
+			display=self.display.display,
+			onerror=onerror,
+			window=X.NONE,
+			selection=self.SELECTION,
+			time=X.CurrentTime,
+		)
+		self.display.flush()
+		if onerror.get_error():
+			raise BrokenConnection('Failed to clear selection owner')
+
+	def storeContent(self):
+		if self.content is None or not self.save_targets:
+			return
+		try:
+			clipboardManager = self.display.get_selection_owner(
+				self.CLIPBOARD_MANAGER
+			)
+		except BadAtom as e:
+			raise BrokenConnection('Broken Clipboard Manager atom') from e
+		if clipboardManager != X.NONE:
+			onerror = CatchError()
+			self.window.change_property(
+				self.ST_PROPERTY,
+				Xatom.ATOM,
+				32,
+				self.save_targets,
+				onerror=onerror,
+			)
+			self.window.convert_selection(
+				self.CLIPBOARD_MANAGER,
+				self.SAVE_TARGETS,
+				self.ST_PROPERTY,
 				X.CurrentTime,
-				onerror=errHandler
+				onerror=onerror,
 			)
-			try:
-				self.display.flush()
-			except Exception as e:
-				ErrorReporter.print(e)
-				self.reset()
-				break
-			if errHandler.get_error():
-				self.reset()
-				break
-			try:
-				current_owner = self.display.get_selection_owner(self.SELECTION)
-			except (BadAtom, RuntimeError, TypeError) as e:
-				ErrorReporter.print(e)
-				self.reset()
-				break
-			if current_owner == self.window:
-				server = Thread(
-					target=serve, name='klembord XSetter server', daemon=True
-				)
-				server.start()
+			self.display.flush()
+			if onerror.get_error():
+				raise BrokenConnection('Failed to convert selection')
+			self.save_targets = []
 
-	def processEvents(self):
-		while True:
-			if self._break:
-				self.killX()
-				break
+	def localContent(self, targets, view=False):
+		# Answers get() straight from the content we own, without going
+		# through the X server. None if we don't own the selection. Data
+		# is bytes, as get() always returns, other buffers are copied unless
+		# view asks for a memoryview of them.
+		local = self.local
+		if local is None:
+			return None
+		latest = self.latest
+		if latest is not None:
+			# Set already, the event thread just didn't get to it yet.
+			local = latest[0]
+		content = {}
+		for target in targets:
+			if target == 'TARGETS':
+				data = ('TARGETS', 'SAVE_TARGETS', 'MULTIPLE')
+				data += tuple(t for t, value in local.items() if value)
+			else:
+				data = local.get(target)
+				if isinstance(data, LazyContent):
+					data = data.resolve()
+				if isinstance(data, str):
+					data = data.encode()
+				elif data is not None and not isinstance(data, bytes):
+					data = memoryview(data) if view else bytes(data)
+			content[target] = data
+		return content
+
+	@staticmethod
+	def openSource(data):
+		# Turns files and mappings into memoryviews we can slice from as
+		# requests come in. Files are mapped whole where they can be, so
+		# their pages are only read when served.
+		if isinstance(data, (str, ByteString, type(None))) or callable(data):
+			return data
+		elif isinstance(data, memoryview):
+			return data.cast('B') if data.format != 'B' else data
+		elif isinstance(data, mmap.mmap):
+			return memoryview(data)
+		elif isinstance(data, os.PathLike):
+			with open(data, 'rb') as source:
+				return XSetter.mapFile(source)
+		elif hasattr(data, 'read'):
+			return XSetter.mapFile(data)
+		raise TypeError('Unsupported data type:\n{}'.format(repr(data)))
+
+	@staticmethod
+	def mapFile(source):
+		getbuffer = getattr(source, 'getbuffer', None)
+		if getbuffer is not None:
+			return getbuffer()
+		try:
+			fileno = source.fileno()
+			status = os.fstat(fileno)
+		except (OSError, ValueError, AttributeError, io.UnsupportedOperation):
+			status = None
+		if status is None or not stat.S_ISREG(status.st_mode):
+			# Pipes, sockets and the like, there's nothing to map.
+			return source.read()
+		if not status.st_size:
+			return b''
+		# The mapping keeps a descriptor of its own, source may close.
+		return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+
+	@staticmethod
+	def contentDigest(content):
+		# Only text and bytes are compared, for anything else, lazy and file
+		# content included, set() always takes ownership again.
+		digest = hashlib.blake2b(digest_size=16)
+		for target, data in content.items():
+			if isinstance(data, str):
+				data = data.encode()
+			elif data is not None and not isinstance(data, ByteString):
+				return None
+			digest.update(target.encode())
+			if data is None:
+				digest.update(struct.pack('=q', -1))
+			else:
+				digest.update(struct.pack('=q', len(data)))
+				digest.update(data)
+		return digest.digest()
+
+	def set(self, content, force=False):
+		content = {
+			target: self.openSource(data) for target, data in content.items()
+		}
+		for target, data in content.items():
+			if callable(data):
+				# Wrapped before the event thread sees it, so a local get()
+				# of content still waiting in self.latest resolves it too,
+				# and both get() and the reply table share one result.
+				content[target] = LazyContent(data)
+		digest = None if force else self.contentDigest(content)
+		if self.coalesce is None:
+			self.call(self.takeOwnership, content, digest)
+			return
+		with self.latestLock:
+			queued = self.latest is not None
+			self.latest = (content, digest)
+		if not queued:
+			self.connection.post(self.applyLatest)
+
+	def store(self):
+		self.call(self.storeContent)
+
+	def clear(self):
+		self.call(self.dropOwnership)
+
+	def exit(self):
+		self.killX()
+
+
+SelectionChange = namedtuple(
+	'SelectionChange', ('selection', 'owner', 'timestamp', 'content')
+)
+
+
+class XWatcher(object):
+	# Reports selection ownership changes announced by XFixes. Iterating
+	# blocks until the next change, with a callback a thread of its own
+	# iterates instead. Targets are prefetched on the consuming thread, the
+	# shared event thread is never held up by them. When the connection is
+	# lost the watcher moves to the selection's new getter connection,
+	# changes made in between aren't reported. Only if that fails too is the
+	# error reported and iteration stopped.
+
+	def __init__(self, xselection, targets=None, callback=None):
+		self.xselection = xselection
+		self.targets = targets
+		self.events = Queue()
+		self.closed = False
+		getter = xselection.getter
+		self.connection = getter.connection
+		self.SELECTION = getter.SELECTION
+		if not self.connection.xfixes:
+			raise RuntimeError('X server lacks the XFIXES extension')
+		self.connection.addWatcher(self.SELECTION, self.events)
+		if callback is not None:
+			Thread(
+				target=self.run,
+				args=(callback, ),
+				name='klembord XWatcher',
+				daemon=True,
+			).start()
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		xevent = self.events.get()
+		while xevent is None and not self.closed:
+			# The connection was lost.
 			try:
-				if self.display.pending_events():
-					xevent = self.display.next_event()
-					if (
-						xevent.type == X.SelectionRequest
-						and xevent.owner == self.window
-						and xevent.selection == self.SELECTION
-					):
-						self.requests.put_nowait(xevent)
-					elif (
-						xevent.type == X.SelectionClear
-						and xevent.window == self.window
-						and xevent.atom == self.SELECTION
-					):
-						self.requests.put_nowait(xevent)
-					elif (
-						xevent.type == X.SelectionNotify
-						and xevent.selection == self.CLIPBOARD_MANAGER
-						and xevent.target == self.SAVE_TARGETS
-					):
-						self.requests.put_nowait(xevent)
-				time.sleep(0.005)
+				self.reconnect()
 			except Exception as e:
 				ErrorReporter.print(e)
-				self.reset()
+				self.closed = True
 				break
+			xevent = self.events.get()
+		if xevent is None:
+			# Leave the marker for any other thread iterating.
+			self.events.put_nowait(None)
+			raise StopIteration
+		owner = getattr(xevent.owner, 'id', xevent.owner) or None
+		content = None
+		if self.targets and owner is not None:
+			content = self.xselection.get(self.targets)
+		return SelectionChange(
+			self.xselection.selection,
+			owner,
+			xevent.selection_timestamp,
+			content,
+		)
 
-	def set(self, content):
-		self.save_targets.clear()
-		content_atoms = {}
-		for target, data in content.items():
-			if not isinstance(data, (str, ByteString, type(None))):
-				raise TypeError('Unsupported data type:\n{}'.format(repr(data)))
-			with ThreadingTimeout(0.05) as timeout:
-				try:
-					target_atom = self.display.intern_atom(target)
-				except RuntimeError as e:
-					ErrorReporter.print(e)
-					raise BrokenConnection('Failed to intern atom') from e
-			if timeout.state == timeout.TIMED_OUT:
-				raise BrokenConnection('Interning atoms timed out')
-			if data:
-				self.save_targets.append(target_atom)
-			content_atoms[target_atom] = data
-		if self.content_set:
-			with ThreadingTimeout(0.05) as timeout:
-				self.window.send_event(self.selection_clear, onerror=errHandler)
-				try:
-					self.display.flush()
-				except Exception as e:
-					ErrorReporter.print(e)
-					raise BrokenConnection('Failed to flush events') from e
-				if errHandler.get_error():
-					raise BrokenConnection('Failed to send events')
-			if timeout.state == timeout.TIMED_OUT:
-				raise BrokenConnection('Sending event timed out')
-		self.outbox.put_nowait(content_atoms)
+	def __enter__(self):
+		return self
 
-	def store(self):
-		if self.content_set:
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def run(self, callback):
+		for change in self:
 			try:
-				clipboardManager = self.display.get_selection_owner(
-					self.CLIPBOARD_MANAGER
-				)
-			except BadAtom as e:
+				callback(change)
+			except Exception as e:
 				ErrorReporter.print(e)
-				raise BrokenConnection('Broken Clipboard Manager atom') from e
-			if clipboardManager != X.NONE:
-				self.window.change_property(
-					self.ST_PROPERTY,
-					Xatom.ATOM,
-					32,
-					self.save_targets,
-					onerror=errHandler,
-				)
-				try:
-					self.display.flush()
-				except Exception as e:
-					ErrorReporter.print(e)
-					raise BrokenConnection('Failed to flush events') from e
-				if errHandler.get_error():
-					raise BrokenConnection('Failed to change window property')
-				self.window.convert_selection(
-					self.CLIPBOARD_MANAGER,
-					self.SAVE_TARGETS,
-					self.ST_PROPERTY,
-					X.CurrentTime,
-					onerror=errHandler,
-				)
-				try:
-					self.display.flush()
-				except Exception as e:
-					ErrorReporter.print(e)
-					raise BrokenConnection('Failed to flush events') from e
-				if errHandler.get_error():
-					raise BrokenConnection('Failed to convert selection')
-				self.save_targets.clear()
 
-	def clear(self):
-		self.save_targets.clear()
-		self.content_set = True
-		self.outbox.put_nowait({})
-		self.window.send_event(self.selection_clear, onerror=errHandler)
-		try:
-			self.display.flush()
-		except Exception as e:
-			ErrorReporter.print(e)
-			raise BrokenConnection('Failed to flush events') from e
-		if errHandler.get_error():
-			raise BrokenConnection('Failed to send events')
+	def reconnect(self):
+		getter = self.xselection.getter
+		if getter.broken:
+			self.xselection.resetGetter()
+			getter = self.xselection.getter
+		if not getter.connection.xfixes:
+			raise RuntimeError('X server lacks the XFIXES extension')
+		self.connection = getter.connection
+		self.connection.addWatcher(self.SELECTION, self.events)
+		if self.closed:
+			# Closed meanwhile, from another thread.
+			self.connection.removeWatcher(self.SELECTION, self.events)
 
-	def exit(self):
-		self._break = True
-		self.outbox.put_nowait(None)
-		self.requests.put_nowait(None)
-		# self.join()
-		# self.eventLoop.join()
-		time.sleep(0.005)
+	def close(self):
+		self.closed = True
+		self.connection.removeWatcher(self.SELECTION, self.events)
+		self.events.put_nowait(None)
 
 
 class XSelection(object):
+	getterClass = XGetter
+	setterClass = XSetter
 
-	def __init__(self, selection='CLIPBOARD'):
+	def __init__(
+		self, selection='CLIPBOARD', timeout=None, negotiate=False,
+		coalesce=None,
+	):
 		self.selection = selection
-		self.getter = XGetter(selection=selection)
-		self.setter = XSetter(selection=selection, reset=self.resetSetter)
+		self.timeout = timeout
+		self.negotiate = negotiate
+		self.coalesce = coalesce
 		self.lastContent = None
+		# Getter and setter connect on first use.
+		self._getter = None
+		self._setter = None
+		self.lock = Lock()
 
+	@property
+	def getter(self):
+		if self._getter is None:
+			with self.lock:
+				if self._getter is None:
+					self._getter = self.getterClass(
+						selection=self.selection, timeout=self.timeout
+					)
+		return self._getter
+
+	@property
+	def setter(self):
+		if self._setter is None:
+			with self.lock:
+				if self._setter is None:
+					self._setter = self.setterClass(
+						selection=self.selection,
+						reset=self.resetSetter,
+						coalesce=self.coalesce,
+					)
+		return self._setter
+
+	@spanned('reconnect.setter')
 	def resetSetter(self):
-		self.setter.exit()
-		self.setter = XSetter(selection=self.selection, reset=self.resetSetter)
+		# Content we owned is set again once, through the new setter only.
+		# If that fails too the error is left to the caller, every retry is
+		# a new connection and window.
+		if self._setter is not None:
+			self._setter.exit()
+		self._setter = self.setterClass(
+			selection=self.selection,
+			reset=self.resetSetter,
+			coalesce=self.coalesce,
+		)
 		if self.lastContent:
-			self.set(self.lastContent)
+			self._setter.set(self.lastContent)
 
-	def get(self, targets):
+	@spanned('get')
+	def get(self, targets, negotiate=None):
+		if self._setter is not None:
+			content = self._setter.localContent(targets)
+			if content is not None:
+				if instrument.hook is not None:
+					instrument.hook.count('get.local')
+				return content
+		if negotiate is None:
+			negotiate = self.negotiate
 		try:
-			return self.getter.get(targets)
+			return self.getter.get(targets, negotiate=negotiate)
 		except BrokenConnection:
-			self.getter.exit()
-			self.getter = XGetter(selection=self.selection)
-			return self.get(targets)
+			self.resetGetter()
+			return self.getter.get(targets, negotiate=negotiate)
 
-	def set(self, content):
+	@spanned('get')
+	def getPreferred(self, targets):
+		if self._setter is not None:
+			content = self._setter.localContent(targets)
+			if content is not None:
+				for target, data in content.items():
+					if data is not None and target != 'TARGETS':
+						return target, data
+				return None, None
 		try:
-			self.setter.set(content)
+			return self.getter.getPreferred(targets)
+		except BrokenConnection:
+			self.resetGetter()
+			return self.getter.getPreferred(targets)
+
+	def open(self, target):
+		if self._setter is not None:
+			content = self._setter.localContent((target, ), view=True)
+			if content is not None:
+				data = content[target]
+				return None if data is None else io.BytesIO(data)
+		try:
+			return self.getter.open(target)
+		except BrokenConnection:
+			self.resetGetter()
+			return self.getter.open(target)
+
+	def close(self):
+		# Getter and setter let go of the shared connection, the last user
+		# closes it. Using the object again connects anew.
+		with self.lock:
+			getter, self._getter = self._getter, None
+			setter, self._setter = self._setter, None
+		self.lastContent = None
+		if getter is not None:
+			getter.exit()
+		if setter is not None:
+			setter.exit()
+
+	@spanned('reconnect.getter')
+	def resetGetter(self):
+		self.getter.exit()
+		self._getter = self.getterClass(
+			selection=self.selection, timeout=self.timeout
+		)
+
+	@spanned('set')
+	def set(self, content, force=False):
+		# Kept for resets already opened, files are mapped only once.
+		content = {
+			target: XSetter.openSource(data)
+			for target, data in content.items()
+		}
+		self.lastContent = content
+		try:
+			self.setter.set(content, force=force)
 		except BrokenConnection:
 			self.resetSetter()
 
+	@spanned('store')
 	def store(self):
+		if self._setter is None:
+			return
 		try:
 			self.setter.store()
 		except BrokenConnection:
 			self.resetSetter()
-			self.store()
+			self.setter.store()
+
+	@spanned('snapshot')
+	def snapshot(self, max_bytes=None, limits=None):
+		# TARGETS is fetched unless cached for this owner, then the rest in
+		# one batch, with MULTIPLE where the owner supports it.
+		if self._setter is not None:
+			content = self.localSnapshot(max_bytes, limits)
+			if content is not None:
+				return content
+		try:
+			return self.getter.snapshot(max_bytes, limits)
+		except BrokenConnection:
+			self.resetGetter()
+			return self.getter.snapshot(max_bytes, limits)
+
+	def localSnapshot(self, max_bytes, limits):
+		local = self._setter.localContent(('TARGETS', ))
+		if local is None:
+			return None
+		sizes = requested_sizes(local['TARGETS'], max_bytes, limits)
+		content = self._setter.localContent(sizes)
+		if content is None:
+			return None
+		if instrument.hook is not None:
+			instrument.hook.count('get.local')
+		return kept_content(content, sizes)
+
+	def watch(self, callback=None, targets=None):
+		return XWatcher(self, targets=targets, callback=callback)
 
 	def clear(self):
+		self.lastContent = None
 		try:
 			self.setter.clear()
 		except BrokenConnection as e:
 			ErrorReporter.print(e)
 			self.resetSetter()
-			self.clear()
+			self.setter.clear()
+
+
+class AsyncXConnection(XConnection):
+	# XConnection driven by an asyncio event loop instead of a thread of its
+	# own. The loop watches the display socket and the wake-up pipe, and
+	# commands run right away since callers are on the loop's thread
+	# already. Those that need a reply, getting the selection owner,
+	# interning new atoms, acquiring ownership, block the loop for that one
+	# round trip. Connections are shared per display and loop.
+	connections = {}  # type: dict
+
+	@classmethod
+	def open(cls, name=None, loop=None):
+		if name is None:
+			name = os.environ.get('DISPLAY')
+		if loop is None:
+			try:
+				loop = asyncio.get_running_loop()
+			except AttributeError:
+				# Python 3.6, called from a coroutine this is the running loop.
+				loop = asyncio.get_event_loop()
+		with cls.lock:
+			connection = cls.connections.get((name, loop))
+			if connection is None or connection.broken:
+				connection = cls(name, loop)
+				cls.connections[(name, loop)] = connection
+			connection.users += 1
+			return connection
+
+	def __init__(self, name, loop):
+		self.loop = loop
+		self.loopThread = get_ident()
+		self.timer = None
+		self.attached = False
+		super().__init__(name)
+
+	def start(self):
+		for fileno in self.reactor.readers():
+			self.loop.add_reader(fileno, self.process)
+		self.attached = True
+
+	def stop(self):
+		self._break = True
+		self.shutdown()
+
+	def shutdown(self):
+		if not self.attached:
+			return
+		self.attached = False
+		if self.timer is not None:
+			self.timer.cancel()
+		for fileno in self.reactor.readers():
+			self.loop.remove_reader(fileno)
+		super().shutdown()
+
+	def process(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		try:
+			self.reactor.drain()
+			for xevent in self.reactor.events():
+				self.dispatch(xevent)
+			timeout = self.expireTransfers()
+		except Exception as e:
+			ErrorReporter.print(e)
+			self.lost()
+			return
+		if timeout is not None:
+			self.timer = self.loop.call_later(timeout, self.process)
+
+	def call(self, command, *args, timeout=None):
+		if self.broken or self._break:
+			raise BrokenConnection('Connection closed')
+		try:
+			return command(*args)
+		except BrokenConnection:
+			raise
+		except Exception as e:
+			ErrorReporter.print(e)
+			raise BrokenConnection('Command failed: {}'.format(e)) from e
+		finally:
+			# Events read while waiting for replies are handled by the loop.
+			self.reactor.wakeup()
+
+	def post(self, command, *args):
+		if get_ident() != self.loopThread:
+			# Say, a provider's thread, the command runs on the loop.
+			if self.broken or self._break:
+				raise BrokenConnection('Connection closed')
+			self.loop.call_soon_threadsafe(self.post, command, *args)
+			return
+		try:
+			self.call(command, *args)
+		except BrokenConnection as e:
+			if self.broken or self._break:
+				raise
+			if e.__cause__ is None:
+				# Anything else was reported by call() already.
+				ErrorReporter.print(e)
+
+
+class AsyncXGetter(XGetter):
+	# get() and getPreferred() as coroutines that wait for replies on the
+	# event loop. Cancelling them, e.g. with asyncio.wait_for(), forgets the
+	# outstanding targets the same way a timeout does. Only the conversions
+	# are awaited, owner() and interning unknown target names are short
+	# blocking round trips on the loop's thread.
+
+	def openConnection(self):
+		return AsyncXConnection.open()
+
+	async def get(self, targets, timeout=None, negotiate=False):
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		content = dict.fromkeys(targets)
+		owner, key = self.owner()
+		if owner != X.NONE:
+			if negotiate:
+				offered = await self.offered(owner, key, timeout)
+				targets = [
+					target for target in targets
+					if target == 'TARGETS' or target in offered
+				]
+			if targets:
+				content.update(await self.fetch(owner, key, targets, timeout))
+		return content
+
+	async def getPreferred(self, targets, timeout=None):
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		owner, key = self.owner()
+		if owner != X.NONE:
+			offered = await self.offered(owner, key, timeout)
+			for target in targets:
+				if target in offered:
+					content = await self.fetch(owner, key, (target, ), timeout)
+					if content[target] is not None:
+						return target, content[target]
+		return None, None
+
+	async def offered(self, owner, key, timeout):
+		cached_key, cached = self.ownerTargets
+		if key[1] is not None and cached_key == key:
+			return cached
+		content = await self.fetch(owner, key, ('TARGETS', ), timeout)
+		return content['TARGETS'] or ()
+
+	async def snapshot(self, max_bytes=None, limits=None, timeout=None):
+		if timeout is None:
+			timeout = self.timeout
+		if self.broken:
+			raise BrokenConnection('X connection lost')
+		owner, key = self.owner()
+		if owner == X.NONE:
+			return {}
+		offered = await self.offered(owner, key, timeout)
+		sizes = requested_sizes(offered, max_bytes, limits)
+		if not sizes:
+			return {}
+		content = await self.fetch(owner, key, tuple(sizes), timeout, sizes)
+		return kept_content(content, sizes)
+
+	async def fetch(self, owner, key, targets, timeout, limits=None):
+		started = time.perf_counter()
+		window, replies = self.request(key, targets, limits)
+		futures = {
+			reply: asyncio.wrap_future(reply)
+			for _, reply in replies.values()
+		}
+		try:
+			await asyncio.wait(futures.values(), timeout=timeout)
+			running = [
+				future for reply, future in futures.items() if reply.running()
+			]
+			if running:
+				await asyncio.wait(running)
+		finally:
+			content = self.collect(key, window, replies, started)
+		return content
+
+
+class AsyncXSetter(XSetter):
+	# Commands run inline on the event loop. Setting, clearing and storing
+	# block it for their round trips to the X server, acquire() waits for
+	# the ownership reply. Lazy content is still resolved on a thread of its
+	# own, see XSetter.deferRequest().
+
+	def openConnection(self):
+		return AsyncXConnection.open()
+
+
+class AsyncXSelection(XSelection):
+	# XSelection for asyncio, its connection belongs to the event loop it is
+	# first used from.
+	getterClass = AsyncXGetter
+	setterClass = AsyncXSetter
+
+	@spanned('get')
+	async def get(self, targets, negotiate=None):
+		if self._setter is not None:
+			content = self._setter.localContent(targets)
+			if content is not None:
+				if instrument.hook is not None:
+					instrument.hook.count('get.local')
+				return content
+		if negotiate is None:
+			negotiate = self.negotiate
+		try:
+			return await self.getter.get(targets, negotiate=negotiate)
+		except BrokenConnection:
+			self.resetGetter()
+			return await self.getter.get(targets, negotiate=negotiate)
+
+	@spanned('get')
+	async def getPreferred(self, targets):
+		if self._setter is not None:
+			content = self._setter.localContent(targets)
+			if content is not None:
+				for target, data in content.items():
+					if data is not None and target != 'TARGETS':
+						return target, data
+				return None, None
+		try:
+			return await self.getter.getPreferred(targets)
+		except BrokenConnection:
+			self.resetGetter()
+			return await self.getter.getPreferred(targets)
+
+	@spanned('snapshot')
+	async def snapshot(self, max_bytes=None, limits=None):
+		if self._setter is not None:
+			content = self.localSnapshot(max_bytes, limits)
+			if content is not None:
+				return content
+		try:
+			return await self.getter.snapshot(max_bytes, limits)
+		except BrokenConnection:
+			self.resetGetter()
+			return await self.getter.snapshot(max_bytes, limits)